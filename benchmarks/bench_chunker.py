@@ -0,0 +1,110 @@
+import sys
+sys.path.append('.')
+sys.path.append('server')
+
+import argparse
+import collections
+import io
+import re
+import time
+from contextlib import redirect_stdout
+
+import spacy
+from spacy.tokens import Doc
+
+import spacy_components
+from tagchunker import chunk_tags
+
+# a token of a chunk line, e.g. "concentrations (NNS, concentration)"
+TOKEN_PATTERN = re.compile(r'(\S+) \((\S+?), (\S*?)\)(?=\s)')
+CHUNK_LINE_PATTERN = re.compile(r'^\[ (.*) \{(\S+)\} \]$')
+
+def read_chunk_file(path):
+    '''
+        Reads the sentences of a SemRep chunk output (e.g. test_files/out.ml.chunk)
+
+        :returns
+            list of (words, tags, [(start, end, chunk_type)])
+    '''
+    sentences = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if '|text|' in line:
+                sentences.append(([], [], []))
+                continue
+
+            match = CHUNK_LINE_PATTERN.match(line)
+            if match is None or not sentences:
+                continue
+
+            words, tags, chunks = sentences[-1]
+            start = len(words)
+            for token in TOKEN_PATTERN.finditer(match.group(1) + ' '):
+                words.append(token.group(1))
+                tags.append(token.group(2))
+            chunks.append((start, len(words), match.group(2)))
+    return [sentence for sentence in sentences if sentence[0]]
+
+def doc_chunks(doc):
+    return [(chunk.span.start, chunk.span.end, chunk.chunk_type) for sentence in doc._.sentences for chunk in sentence.chunks]
+
+def agreement(gold, predicted):
+    '''
+        :params
+            gold, predicted: list of the chunks of each sentence, in the same order
+                             (the offsets of a chunk are relative to its sentence)
+    '''
+    gold = collections.Counter((i, chunk) for i, chunks in enumerate(gold) for chunk in chunks)
+    predicted = collections.Counter((i, chunk) for i, chunks in enumerate(predicted) for chunk in chunks)
+    correct = sum((gold & predicted).values())
+    precision = correct / sum(predicted.values()) if predicted else 0
+    recall = correct / sum(gold.values()) if gold else 0
+    return precision, recall
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the spacy and OpenNLP chunkers with SemRep chunks.')
+    parser.add_argument('--chunk_file', default='test_files/out.ml.chunk')
+    parser.add_argument('--opennlp_path', default=None, help='OpenNLP install, to also run the OpenNLP chunker')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    sentences = read_chunk_file(args.chunk_file)
+    gold = [chunks for words, tags, chunks in sentences]
+    print(f'{len(sentences)} sentences, {sum(len(chunks) for chunks in gold)} chunks')
+
+    start = time.time()
+    for _ in range(args.repeat):
+        predicted = [chunk_tags(tags) for words, tags, chunks in sentences]
+    elapsed = (time.time() - start) / args.repeat
+    precision, recall = agreement(gold, predicted)
+    print(f'tagchunker: {elapsed * 1000:.2f} ms, precision {precision:.3f}, recall {recall:.3f}')
+
+    # the pipeline component gives the same chunks
+    nlp = spacy.blank('en')
+    chunker = nlp.add_pipe('chunker', config = {'chunker' : 'spacy'})
+    start = time.time()
+    component_predicted = []
+    for words, tags, chunks in sentences:
+        doc = Doc(nlp.vocab, words = words, tags = tags, sent_starts = [True] + [False] * (len(words) - 1))
+        doc._.sentences = []
+        component_predicted.append(doc_chunks(chunker(doc)))
+    elapsed = time.time() - start
+    assert component_predicted == predicted
+    print(f'spacy chunker component: {elapsed * 1000:.2f} ms', file = sys.stderr)
+
+    if args.opennlp_path is not None:
+        # the Doc extensions are already registered by the chunker factory above
+        opennlp_chunker = spacy_components.OpenNLPChunkerComponent(nlp, args.opennlp_path)
+
+        predicted = []
+        # the component prints every chunk
+        with redirect_stdout(io.StringIO()):
+            start = time.time()
+            for words, tags, chunks in sentences:
+                doc = Doc(nlp.vocab, words = words, tags = tags, sent_starts = [True] + [False] * (len(words) - 1))
+                doc._.sentences = []
+                predicted.append(doc_chunks(opennlp_chunker(doc)))
+            elapsed = time.time() - start
+        precision, recall = agreement(gold, predicted)
+        print(f'opennlp: {elapsed * 1000:.2f} ms, precision {precision:.3f}, recall {recall:.3f}')
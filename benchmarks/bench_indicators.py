@@ -0,0 +1,75 @@
+import sys
+sys.path.append('.')
+sys.path.append('server')
+
+import argparse
+import io
+import time
+from contextlib import redirect_stdout
+
+import spacy
+from spacy.tokens import Doc
+
+import spacy_components
+from indicatorindex import IndicatorIndex
+
+# repeated to make sentences of any length
+WORDS = ['Aspirin', 'reduces', 'the', 'risk', 'of', 'stroke', 'due', 'to', 'its', 'inhibitory', 'effect',
+         'on', 'platelets', 'and', 'may', 'cause', 'bleeding', 'in', 'patients', 'with', 'ulcers']
+LEMMAS = ['aspirin', 'reduce', 'the', 'risk', 'of', 'stroke', 'due', 'to', 'its', 'inhibitory', 'effect',
+          'on', 'platelet', 'and', 'may', 'cause', 'bleeding', 'in', 'patient', 'with', 'ulcer']
+TAGS = ['NN', 'VBZ', 'DT', 'NN', 'IN', 'NN', 'IN', 'IN', 'PRP$', 'JJ', 'NN',
+        'IN', 'NNS', 'CC', 'MD', 'VB', 'NN', 'IN', 'NNS', 'IN', 'NNS']
+
+def rescan_indicators(lemmas, srindicator_lemmas):
+    '''
+        The former annotate_indicators loop: one pass per lexeme type, and the rest
+        of the sentence scanned again for each gapped or multiword candidate
+    '''
+    indicators = []
+    for lexeme_type in ['gapped', 'multiword', 'single']:
+        for i, lemma in enumerate(lemmas):
+            if lemma in srindicator_lemmas[lexeme_type]:
+                if lexeme_type == 'single':
+                    indicators.append(i)
+                    continue
+                for next_lemma in lemmas[i + 1:]:
+                    if next_lemma in srindicator_lemmas[lexeme_type][lemma]:
+                        indicators.append(i)
+    return indicators
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the indicator matching on long sentences.')
+    parser.add_argument('--semrules', default='resources/semrules2020.xml')
+    parser.add_argument('--lengths', default='100,1000,5000,20000', help='Sentence lengths in tokens')
+    args = parser.parse_args()
+
+    index = IndicatorIndex.load(args.semrules)
+
+    nlp = spacy.blank('en')
+    component = nlp.add_pipe('srindicator', config = {'semrules' : args.semrules})
+
+    for length in [int(length) for length in args.lengths.split(',')]:
+        repeat = length // len(WORDS) + 1
+        words = (WORDS * repeat)[:length]
+        lemmas = (LEMMAS * repeat)[:length]
+        tags = (TAGS * repeat)[:length]
+
+        start = time.time()
+        matches = index.match(lemmas, [word.lower() for word in words], tags)
+        match_time = time.time() - start
+
+        start = time.time()
+        rescan_indicators(lemmas, index.lemmas)
+        rescan_time = time.time() - start
+
+        doc = Doc(nlp.vocab, words = words, lemmas = lemmas, tags = tags, sent_starts = [True] + [False] * (length - 1))
+        # the component prints every indicator
+        with redirect_stdout(io.StringIO()):
+            start = time.time()
+            component(doc)
+            component_time = time.time() - start
+        assert len(doc._.indicators) == len(matches)
+
+        print(f'{length} tokens, {len(matches)} indicators: match {match_time * 1e6 / length:.2f} us/token, '
+              f'component {component_time * 1e6 / length:.2f} us/token, rescan {rescan_time * 1e6 / length:.2f} us/token')
@@ -0,0 +1,74 @@
+import sys
+sys.path.append('.')
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from lxml import etree
+
+from medline import MedlineDocument, parse_medlinexml_file
+
+def tree_parse_medlinexml_file(file_path):
+    '''
+        Previous reader: the whole file is parsed before the first citation is returned
+    '''
+    medline_xml = etree.parse(file_path)
+    root = medline_xml.getroot()
+
+    medline_docs = list()
+    for doc in root.findall('PubmedArticle/MedlineCitation'):
+        medline_docs.append(MedlineDocument(doc))
+
+    return medline_docs
+
+def write_replicated_file(source_path, path, size):
+    '''
+        Writes the articles of source_path repeatedly until the file has about size bytes
+    '''
+    with open(source_path, 'r', encoding = 'utf-8') as f:
+        xml = f.read()
+    start = xml.index('<PubmedArticle>')
+    end = xml.rindex('</PubmedArticle>') + len('</PubmedArticle>')
+    articles = xml[start:end] + '\n'
+
+    with open(path, 'w', encoding = 'utf-8') as f:
+        f.write(xml[:start])
+        written = 0
+        while written < size:
+            f.write(articles)
+            written += len(articles)
+        f.write(xml[end:])
+
+def run_reader(reader_name, path, queue):
+    # in a new process, so that the peak memory is only the reader's
+    reader = {'iterparse' : parse_medlinexml_file, 'parse' : tree_parse_medlinexml_file}[reader_name]
+    start = time.time()
+    count = sum(1 for doc in reader(path))
+    elapsed = time.time() - start
+    # ru_maxrss is in kilobytes on Linux
+    queue.put((count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the MEDLINE XML readers on a replicated baseline-sized file.')
+    parser.add_argument('--source', default='test_files/medlinexml/test.xml')
+    parser.add_argument('--size_mb', type=int, default=100, help='Size of the replicated file')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'medline.xml')
+        write_replicated_file(args.source, path, args.size_mb * 1024 * 1024)
+        size = os.path.getsize(path) / 1024 / 1024
+
+        for reader_name in ['iterparse', 'parse']:
+            queue = context.Queue()
+            process = context.Process(target = run_reader, args = (reader_name, path, queue))
+            process.start()
+            count, elapsed, peak = queue.get()
+            process.join()
+            print(f'{reader_name}: {count} citations in {elapsed:.2f} s ({size / elapsed:.1f} MB/s), '
+                  f'peak memory {peak:.0f} MB')
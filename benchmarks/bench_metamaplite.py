@@ -0,0 +1,77 @@
+import sys
+sys.path.append('.')
+sys.path.append('server')
+
+import itertools
+import timeit
+import tracemalloc
+
+from metamaplite import MetamapLite
+from spacy_components import NON_HYPERNYM_SEMGROUPS
+
+def dict_parse_annotations(annotations):
+    '''
+        Previous parser: one dict and two new lists per candidate concept
+    '''
+    parsed_annotations = {}
+
+    field_names = ['cui', 'name', 'concept_string', 'score', 'semtypes', 'semgroups']
+    field_list_objs = ['semtypes', 'semgroups']
+    for annotation in annotations.split(";;"):
+        if annotation.endswith(',,'):
+            annotation = annotation[:-2]
+        if annotation.strip() == '':
+            continue
+
+        field_values = annotation.split(',,')
+        span = (int(field_values[0]), int(field_values[1]))
+
+        concepts = []
+        for index in range(2, len(field_values), len(field_names)):
+            concept = dict(zip(field_names, field_values[index: index + len(field_names) + 1]))
+            for field_name in field_list_objs:
+                concept[field_name] = concept[field_name].split('::')
+            concepts.append(concept)
+
+        parsed_annotations[span] = concepts
+
+    return parsed_annotations
+
+def set_hypernym_check(concept_1, concept_2):
+    sem_groups = set(concept_1['semgroups']).intersection(set(concept_2['semgroups']))
+    return len(sem_groups - set(['anat', 'conc'])) != 0
+
+def mask_hypernym_check(concept_1, concept_2):
+    return concept_1.semgroup_mask & concept_2.semgroup_mask & ~NON_HYPERNYM_SEMGROUPS != 0
+
+def allocated(parse, responses):
+    tracemalloc.start()
+    parsed = [parse(response) for response in responses]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+if __name__ == '__main__':
+    # MetaMapLite responses dumped by MetamapLite.annotate
+    with open('an.tmp', 'r') as f:
+        responses = [line.strip() for line in f if line[:1].isdigit()]
+
+    metamaplite = MetamapLite('localhost', 12345)
+    print(f'{len(responses)} responses')
+
+    dicts = timeit.timeit(lambda: [dict_parse_annotations(response) for response in responses], number = 5) / 5
+    records = timeit.timeit(lambda: [metamaplite.parse_annotations(response) for response in responses], number = 5) / 5
+    print(f'parse: dicts {dicts * 1000:.2f} ms, ScoredConcepts {records * 1000:.2f} ms')
+
+    print(f'memory: dicts {allocated(dict_parse_annotations, responses) / 1024:.0f} KiB, '
+          f'ScoredConcepts {allocated(metamaplite.parse_annotations, responses) / 1024:.0f} KiB')
+
+    dict_concepts = [concepts[0] for response in responses for concepts in dict_parse_annotations(response).values()]
+    record_concepts = [concepts[0] for response in responses for concepts in metamaplite.parse_annotations(response).values()]
+    dict_pairs = list(itertools.islice(itertools.permutations(dict_concepts, 2), 200000))
+    record_pairs = list(itertools.islice(itertools.permutations(record_concepts, 2), 200000))
+    assert [set_hypernym_check(*pair) for pair in dict_pairs] == [mask_hypernym_check(*pair) for pair in record_pairs]
+
+    sets = timeit.timeit(lambda: [set_hypernym_check(*pair) for pair in dict_pairs], number = 3) / 3
+    masks = timeit.timeit(lambda: [mask_hypernym_check(*pair) for pair in record_pairs], number = 3) / 3
+    print(f'semantic group check ({len(dict_pairs)} pairs): sets {sets * 1000:.2f} ms, masks {masks * 1000:.2f} ms')
@@ -0,0 +1,173 @@
+import collections
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+
+# returned by LookupCache.get for keys that were never stored
+# (None is a valid cached value, e.g. a lookup without any match)
+MISSING = object()
+
+class LookupCache:
+    '''
+        Two-tier cache for expensive lookups.
+
+        The first tier is an in-process LRU of at most maxsize entries. The optional
+        second tier is a sqlite file that persists across runs and can be shared by
+        several worker processes. Values are pickled in sqlite, so negative results
+        (None) are cached like any other value.
+
+        Entries older than ttl seconds are treated as missing. The persistent tier is
+        kept to at most max_disk_entries entries by dropping the oldest ones.
+    '''
+    # number of writes between two size checks of the persistent tier
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, maxsize = 100000, path = None, ttl = None, max_disk_entries = None):
+        '''
+            :params
+                maxsize: number of entries kept in memory (0 disables the memory tier)
+                path: sqlite file of the persistent tier (optional)
+                ttl: seconds after which an entry expires (optional)
+                max_disk_entries: number of entries kept in the persistent tier (optional)
+        '''
+        self.maxsize = maxsize
+        self.path = path
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        # key -> (value, time stored)
+        self.memory = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout = 30, isolation_level = None, check_same_thread = False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, created REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS cache_created ON cache (created)')
+            self.prune()
+
+    def is_expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                value, created = self.memory[key]
+                if not self.is_expired(created):
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.memory[key]
+
+            if self.db is not None:
+                row = self.db.execute('SELECT value, created FROM cache WHERE key = ?', (key,)).fetchone()
+                if row is not None and not self.is_expired(row[1]):
+                    value = pickle.loads(row[0])
+                    self.remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        with self.lock:
+            created = time.time()
+            self.remember(key, value, created)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)',
+                                (key, pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL), created))
+                self.writes += 1
+                if self.writes % self.PRUNE_INTERVAL == 0:
+                    self.prune()
+
+    def remember(self, key, value, created):
+        if self.maxsize <= 0:
+            return
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last = False)
+
+    def prune(self):
+        '''
+            Drops expired entries and the oldest entries above max_disk_entries from the persistent tier
+        '''
+        if self.ttl is not None:
+            self.db.execute('DELETE FROM cache WHERE created < ?', (time.time() - self.ttl,))
+        if self.max_disk_entries is not None:
+            count = self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count > self.max_disk_entries:
+                self.db.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY created LIMIT ?)',
+                                (count - self.max_disk_entries,))
+
+    def stats(self):
+        return {'hits' : self.hits, 'disk_hits' : self.disk_hits, 'misses' : self.misses,
+                'size' : len(self.memory)}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+class CachedAnnotator:
+    '''
+        Caches the parsed annotations of a concept annotator (e.g. MetamapLite, GNormPlus)
+
+        Entries are keyed by a hash of the ontology name, a version tag and the text,
+        so changing the version tag (e.g. after a server or knowledge source update)
+        invalidates the cached annotations of that ontology only.
+    '''
+    def __init__(self, annotator, name, version = '', cache = None):
+        '''
+            :params
+                annotator: object with an annotate(text) method
+                name: ontology name
+                version: version tag of the server
+                cache: LookupCache, shared by several annotators (optional)
+        '''
+        self.annotator = annotator
+        self.name = name
+        self.version = version
+        self.cache = cache if cache is not None else LookupCache()
+
+    def key(self, text):
+        # entries cached before a change of the parsed annotations are not reused
+        annotation_format = getattr(self.annotator, 'annotation_format', 1)
+        return hashlib.sha1(f'{self.name}\0{self.version}\0{annotation_format}\0{text}'.encode('UTF-8')).hexdigest()
+
+    def annotate(self, text):
+        key = self.key(text)
+        annotations = self.cache.get(key)
+        if annotations is MISSING:
+            annotations = self.annotator.annotate(text)
+            self.cache.set(key, annotations)
+        return annotations
+
+    def annotate_batch(self, texts):
+        '''
+            Only the texts that are not cached are sent, with one annotate_batch call
+            if the annotator supports it
+        '''
+        keys = [self.key(text) for text in texts]
+        annotations = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, cached in enumerate(annotations) if cached is MISSING]
+        if missing:
+            if hasattr(self.annotator, 'annotate_batch'):
+                missing_annotations = self.annotator.annotate_batch([texts[i] for i in missing])
+            else:
+                missing_annotations = [self.annotator.annotate(texts[i]) for i in missing]
+
+            for i, missing_annotation in zip(missing, missing_annotations):
+                annotations[i] = missing_annotation
+                self.cache.set(keys[i], missing_annotation)
+        return annotations
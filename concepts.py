@@ -0,0 +1,102 @@
+import sys
+import threading
+
+class Vocabulary:
+    '''
+        Interned codes of a small set of strings (e.g. semantic types)
+
+        Every string gets a bit, so a set of strings is an int mask and set operations
+        are integer operations. Codes are assigned in order of first use and are only
+        meaningful within a process.
+    '''
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+        # field value (e.g. 'orch::phsu') -> (tuple of strings, mask)
+        self.fields = {}
+        self.lock = threading.Lock()
+
+    def code(self, string):
+        code = self.codes.get(string)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(string)
+                if code is None:
+                    code = len(self.strings)
+                    self.strings.append(sys.intern(string))
+                    self.codes[string] = code
+        return code
+
+    def mask(self, strings):
+        mask = 0
+        for string in strings:
+            mask |= 1 << self.code(string)
+        return mask
+
+    def decode(self, mask):
+        return [string for code, string in enumerate(self.strings) if mask >> code & 1]
+
+    def parse(self, field, separator = '::'):
+        '''
+            :returns
+                (tuple of interned strings, mask) of a separated field, shared by all equal fields
+        '''
+        parsed = self.fields.get(field)
+        if parsed is None:
+            strings = tuple(self.strings[self.code(string)] for string in field.split(separator))
+            parsed = (strings, self.mask(strings))
+            self.fields[field] = parsed
+        return parsed
+
+SEMTYPES = Vocabulary()
+SEMGROUPS = Vocabulary()
+
+class ScoredConcept:
+    '''
+        A candidate concept of a MetaMapLite annotation
+
+        Fields can also be read like the dicts used before (concept['cui']).
+        semtypes and semgroups are tuples shared by all concepts with the same
+        types, semtype_mask and semgroup_mask their SEMTYPES and SEMGROUPS masks.
+    '''
+    __slots__ = ('cui', 'name', 'concept_string', 'score', 'semtypes', 'semgroups', 'semtype_mask', 'semgroup_mask')
+
+    def __init__(self, cui, name, concept_string, score, semtypes, semgroups):
+        '''
+            :params
+                semtypes, semgroups: '::' separated fields of the response (or sequences of strings)
+        '''
+        self.cui = cui
+        self.name = name
+        self.concept_string = concept_string
+        self.score = score
+
+        if not isinstance(semtypes, str):
+            semtypes = '::'.join(semtypes)
+        if not isinstance(semgroups, str):
+            semgroups = '::'.join(semgroups)
+        self.semtypes, self.semtype_mask = SEMTYPES.parse(semtypes)
+        self.semgroups, self.semgroup_mask = SEMGROUPS.parse(semgroups)
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def __eq__(self, other):
+        return isinstance(other, ScoredConcept) and self.cui == other.cui and self.name == other.name and \
+               self.concept_string == other.concept_string and self.score == other.score and \
+               self.semtypes == other.semtypes and self.semgroups == other.semgroups
+
+    def __hash__(self):
+        return hash((self.cui, self.concept_string))
+
+    def __reduce__(self):
+        # masks are per process, only the strings are pickled (e.g. in the concept cache)
+        return (ScoredConcept, (self.cui, self.name, self.concept_string, self.score,
+                                '::'.join(self.semtypes), '::'.join(self.semgroups)))
+
+    def __repr__(self):
+        return f'ScoredConcept({self.cui}, {self.name}, {self.concept_string}, {self.score}, ' \
+               f'{list(self.semtypes)}, {list(self.semgroups)})'
@@ -0,0 +1,110 @@
+import argparse
+import pickle
+import re
+import sys
+
+from concepts import ScoredConcept
+from tokentrie import longest_match, trie_add
+
+# score given to every match (MetaMapLite's score of an exact match)
+MATCH_SCORE = '1000.0'
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+class DictionaryConceptMatcher:
+    '''
+        In-process replacement for MetaMapLite built from a concept table.
+
+        Concept strings are stored in a token trie (see tokentrie.py, as in LexIndex):
+        the node reached by the last token of a string holds (cui, name, semtypes,
+        semgroups) of its concepts. annotate returns the same {(start, length) : [ScoredConcept]}
+        as MetamapLite.parse_annotations, so the matches are used as MetaMapLite
+        concepts by the other components.
+    '''
+    # the ConceptMatchComponent builds local annotators from the concept table
+    # instead of connecting to a server
+    local = True
+    annotation_name = 'MetamapLite'
+
+    def __init__(self, path):
+        '''
+            :params
+                path: concept table (see build_trie below) or a trie pickled by save
+        '''
+        if path is None:
+            raise ValueError('DictionaryConceptMatcher needs a concept table (concept_table in the [NLP] config)')
+        self.path = path
+        if path.endswith('.pickle'):
+            with open(path, 'rb') as f:
+                self.trie = pickle.load(f)
+        else:
+            self.trie = build_trie(path)
+
+    def annotate(self, text):
+        '''
+            Finds the longest concept string at each position, left to right
+        '''
+        tokens = [(match.start(), match.end(), match.group().lower()) for match in TOKEN_PATTERN.finditer(text)]
+        units = [(token,) for _, _, token in tokens]
+
+        annotations = {}
+        start = 0
+        while start < len(tokens):
+            end, concepts = longest_match(self.trie, units, start)
+            if end is None:
+                start += 1
+                continue
+
+            char_start = tokens[start][0]
+            char_end = tokens[end - 1][1]
+            concept_string = text[char_start:char_end]
+            annotations[(char_start, char_end - char_start)] = \
+                [ScoredConcept(cui, name, concept_string, MATCH_SCORE, semtypes, semgroups)
+                 for cui, name, semtypes, semgroups in concepts]
+            start = end
+
+        return annotations
+
+    def annotate_batch(self, texts):
+        return [self.annotate(text) for text in texts]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self.trie, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+def build_trie(table_path):
+    '''
+        Builds the token trie from a concept table
+
+        Each line of the table has the tab-separated fields
+        cui, name, strings, semtypes, semgroups
+        where strings are separated by | and semtypes and semgroups by :: (as in the
+        MetaMapLite responses); e.g.
+        C0004057	Aspirin	aspirin|acetylsalicylic acid|ASA	orch::phsu	chem::chem
+    '''
+    trie = {}
+    with open(table_path, 'r', encoding = 'utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 5:
+                continue
+
+            cui, name, strings, semtypes, semgroups = fields[:5]
+            concept = (cui, name, sys.intern(semtypes), sys.intern(semgroups))
+            for string in strings.split('|'):
+                tokens = TOKEN_PATTERN.findall(string.lower())
+                if len(tokens) == 0:
+                    continue
+
+                trie_add(trie, tokens, concept)
+
+    return trie
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the concept index used by DictionaryConceptMatcher.')
+    parser.add_argument('table_path', type=str, help='Concept table (cui, name, strings, semtypes, semgroups)')
+    parser.add_argument('index_path', type=str, help='Path of the index file to write (.pickle)')
+
+    args = parser.parse_args()
+
+    DictionaryConceptMatcher(args.table_path).save(args.index_path)
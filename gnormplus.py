@@ -1,12 +1,13 @@
 from socketclient import SocketClient
 
 class GNormPlus:
-    def __init__(self, host, port):
+    def __init__(self, host, port, **client_options):
         self.host = host
         self.port = port
+        self.client_options = client_options
 
     def annotate(self, text):
-        socket_client = SocketClient(self.host, self.port)
+        socket_client = SocketClient(self.host, self.port, **self.client_options)
         annotations = socket_client.send(text, True)
         # print(annotations)
         return self.parse_annotations(annotations)
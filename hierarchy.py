@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import LookupCache, MISSING
+from socketclient import SocketClient
+
+class HierarchyClient:
+    '''
+        IS-A queries to the hierarchy server, with cached answers
+
+        A query is the concatenation of the two CUIs (e.g. C0003864C0012634 for
+        "is arthritis a disease") and the server answers true or false. The answers
+        of a pair never change for a given knowledge source, so they are kept in a
+        LookupCache (in memory and optionally on disk).
+    '''
+    def __init__(self, host, port, cache = None, batch = False, workers = 8, **client_options):
+        '''
+            :params
+                cache: LookupCache of the answers (optional, in memory by default)
+                batch: the server answers several newline-separated queries in one request,
+                       with one answer per line; otherwise queries are sent concurrently
+                workers: number of concurrent queries without batch
+        '''
+        self.host = host
+        self.port = port
+        self.cache = cache if cache is not None else LookupCache()
+        self.batch = batch
+        self.client_options = client_options
+        self.executor = ThreadPoolExecutor(max_workers = workers)
+
+    def query(self, cui_1, cui_2):
+        socket_client = SocketClient(self.host, self.port, **self.client_options)
+        return socket_client.send(cui_1 + cui_2, True) == 'true'
+
+    def is_a(self, cui_1, cui_2):
+        return self.is_a_many([(cui_1, cui_2)])[(cui_1, cui_2)]
+
+    def is_a_many(self, pairs):
+        '''
+            :params
+                pairs: (cui_1, cui_2) pairs, is cui_1 a cui_2
+            :returns
+                {(cui_1, cui_2) : bool}
+        '''
+        answers = {}
+        missing = []
+        for pair in pairs:
+            if pair in answers:
+                continue
+            answer = self.cache.get(pair[0] + pair[1])
+            if answer is MISSING:
+                missing.append(pair)
+                answers[pair] = None
+            else:
+                answers[pair] = answer
+
+        if len(missing) == 0:
+            return answers
+
+        if self.batch:
+            socket_client = SocketClient(self.host, self.port, **self.client_options)
+            response = socket_client.send('\n'.join(cui_1 + cui_2 for cui_1, cui_2 in missing), True)
+            missing_answers = [line.strip() == 'true' for line in response.split('\n')]
+            if len(missing_answers) != len(missing):
+                raise ValueError(f'Expected {len(missing)} hierarchy answers, got {len(missing_answers)}')
+        else:
+            missing_answers = list(self.executor.map(lambda pair: self.query(*pair), missing))
+
+        for pair, answer in zip(missing, missing_answers):
+            answers[pair] = answer
+            self.cache.set(pair[0] + pair[1], answer)
+
+        return answers
@@ -0,0 +1,168 @@
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+MAGIC = b'SRHI'
+VERSION = 1
+# magic, version, number of concepts, number of ancestors
+HEADER = struct.Struct('=4sIII')
+
+class HierarchyIndex:
+    '''
+        Local replacement for the hierarchy server built from an ancestor closure.
+
+        The index file holds three arrays after the header, read through mmap
+        without copying (so worker processes share the pages):
+            cuis: the numbers of the CUIs (C0012634 -> 12634), sorted (int32)
+            offsets: start of the ancestors of the i-th CUI, plus the end (uint32)
+            ancestors: positions in cuis of the ancestors of each CUI, sorted (int32)
+        so is_a is two binary searches.
+    '''
+    def __init__(self, path):
+        '''
+            :params
+                path: index file written by build_index (see below)
+        '''
+        self.path = path
+        # answers are not cached, a lookup is cheaper than a cache query
+        self.cache = None
+
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        magic, version, cui_count, ancestor_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a hierarchy index (version {VERSION})')
+
+        view = memoryview(self.buffer)
+        start = HEADER.size
+        self.cuis = view[start:start + 4 * cui_count].cast('i')
+        start += 4 * cui_count
+        self.offsets = view[start:start + 4 * (cui_count + 1)].cast('I')
+        start += 4 * (cui_count + 1)
+        self.ancestors = view[start:start + 4 * ancestor_count].cast('i')
+
+    def position(self, cui):
+        number = cui_number(cui)
+        if number is None:
+            return None
+        i = bisect_left(self.cuis, number)
+        if i < len(self.cuis) and self.cuis[i] == number:
+            return i
+        return None
+
+    def is_a(self, cui_1, cui_2):
+        '''
+            Is cui_2 an ancestor of cui_1
+        '''
+        i = self.position(cui_1)
+        j = self.position(cui_2)
+        if i is None or j is None:
+            return False
+
+        lo = self.offsets[i]
+        hi = self.offsets[i + 1]
+        k = bisect_left(self.ancestors, j, lo, hi)
+        return k < hi and self.ancestors[k] == j
+
+    def is_a_many(self, pairs):
+        return {pair : self.is_a(*pair) for pair in pairs}
+
+    def close(self):
+        self.cuis.release()
+        self.offsets.release()
+        self.ancestors.release()
+        self.buffer.close()
+
+def cui_number(cui):
+    if len(cui) < 2 or cui[0] != 'C' or not cui[1:].isdigit():
+        return None
+    return int(cui[1:])
+
+def read_ancestors(path, parents = False):
+    '''
+        Reads the pipe-separated lines cui|ancestor_cui of an ancestor closure
+
+        With parents, the lines are cui|parent_cui and the closure is computed.
+    '''
+    ancestors = {}
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('|')
+            if len(fields) < 2 or cui_number(fields[0]) is None or cui_number(fields[1]) is None:
+                continue
+            ancestors.setdefault(cui_number(fields[0]), set()).add(cui_number(fields[1]))
+
+    if parents:
+        ancestors = closure(ancestors)
+    return ancestors
+
+def closure(parents):
+    '''
+        {cui : set of ancestors} of {cui : set of parents}
+
+        Iterative depth first search in post-order: the ancestors of a concept are
+        computed once all its parents are done, as its parents and their ancestors.
+        A parent on the current path closes a cycle and is only added as a parent.
+    '''
+    ancestors = {}
+    for cui in parents:
+        if cui in ancestors:
+            continue
+        stack = [(cui, iter(parents.get(cui, ())))]
+        path = set([cui])
+        while stack:
+            cur, pending = stack[-1]
+            for parent in pending:
+                if parent not in ancestors and parent not in path:
+                    stack.append((parent, iter(parents.get(parent, ()))))
+                    path.add(parent)
+                    break
+            else:
+                stack.pop()
+                path.discard(cur)
+                cur_ancestors = set()
+                for parent in parents.get(cur, ()):
+                    cur_ancestors.add(parent)
+                    cur_ancestors.update(ancestors.get(parent, ()))
+                cur_ancestors.discard(cur)
+                ancestors[cur] = cur_ancestors
+    return ancestors
+
+def build_index(ancestors, index_path):
+    '''
+        Writes the index of {cui number : set of ancestor cui numbers}
+    '''
+    numbers = set(ancestors)
+    for cui_ancestors in ancestors.values():
+        numbers.update(cui_ancestors)
+
+    cuis = array('i', sorted(numbers))
+    positions = {number : i for i, number in enumerate(cuis)}
+
+    offsets = array('I', [0])
+    flat_ancestors = array('i')
+    for number in cuis:
+        flat_ancestors.extend(sorted(positions[ancestor] for ancestor in ancestors.get(number, ())))
+        offsets.append(len(flat_ancestors))
+
+    with open(index_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(cuis), len(flat_ancestors)))
+        cuis.tofile(f)
+        offsets.tofile(f)
+        flat_ancestors.tofile(f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the ancestor index used for hypernym analysis.')
+    parser.add_argument('source_path', type=str, help='Pipe-separated cui|ancestor_cui lines (or cui|parent_cui, see --parents)')
+    parser.add_argument('index_path', type=str, help='Path of the index file to write')
+    parser.add_argument('--parents', action='store_true', help='Source lines are parent relations, compute their closure')
+
+    args = parser.parse_args()
+
+    ancestors = read_ancestors(args.source_path, args.parents)
+    build_index(ancestors, args.index_path)
+    print(f'{len(ancestors)} concepts with ancestors', file = sys.stderr)
@@ -0,0 +1,229 @@
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import sys
+import xml.etree.ElementTree as ET
+
+from srindicator import SRIndicator, index_first_lemmas
+
+# version of the pickled index, increase when the index or SRIndicator changes
+INDEX_VERSION = 1
+
+# key under which a trie node keeps the indicators ending at that node
+# (lemmas are never empty, so it cannot clash with a child)
+INDICATORS_KEY = ''
+
+# lemmas in the rules file are space-separated and split before hyphens (e.g. co -express),
+# the hyphen is a token of its own as in the spaCy tokenization
+LEMMA_PATTERN = re.compile(r'[^\s-]+|-')
+
+class IndicatorIndex:
+    '''
+        Indicators of the SemRep rules file indexed by their lemmas
+
+            single: lemma -> [SRIndicator]
+            multiword: lemma sequence trie, the node reached by the last lemma holds
+                       the indicators under INDICATORS_KEY (as in DictionaryConceptMatcher)
+            gapped: first part lemma -> {last part lemma -> [SRIndicator]}
+
+        Lemmas are lower-cased. Single indicators with a multi-token lemma (e.g. due to)
+        are in the trie. The lexemes of a multiword indicator are listed head first in
+        the rules file (action, therapeutic), the trie has them in text order.
+    '''
+    def __init__(self, indicators = ()):
+        self.indicators = list(indicators)
+        # first lemma index returned by parse_semrules_file
+        self.lemmas = index_first_lemmas(self.indicators)
+
+        self.single = {}
+        self.multiword = {}
+        self.gapped = {}
+        for indicator in self.indicators:
+            self.add(indicator)
+
+    def add(self, indicator):
+        if indicator.lexeme_type == 'gapped':
+            # the parts of the gapped indicators are single lemmas
+            first = sys.intern(indicator.lexeme[0]['lemma'].lower())
+            last = sys.intern(indicator.lexeme[-1]['lemma'].lower())
+            self.gapped.setdefault(first, {}).setdefault(last, []).append(indicator)
+            return
+
+        lemmas = indicator_lemmas(indicator)
+        if len(lemmas) == 0:
+            return
+        if len(lemmas) == 1:
+            self.single.setdefault(lemmas[0], []).append(indicator)
+            return
+
+        node = self.multiword
+        for lemma in lemmas:
+            node = node.setdefault(lemma, {})
+        node.setdefault(INDICATORS_KEY, []).append(indicator)
+
+    @classmethod
+    def load(cls, path, cache_path = None):
+        '''
+            Reads the rules file (e.g. resources/semrules2020.xml)
+
+            :params
+                cache_path: pickled index, rebuilt when the content of the rules file changes (optional)
+        '''
+        with open(path, 'rb') as f:
+            data = f.read()
+        key = (INDEX_VERSION, hashlib.sha1(data).hexdigest())
+
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                cached_key, index = pickle.load(f)
+            if cached_key == key:
+                return index
+
+        root = ET.fromstring(data)
+        index = cls(SRIndicator(srindicator_xml) for srindicator_xml in root.findall('SRIndicator'))
+
+        if cache_path is not None:
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+            # written to a temporary file first, workers may be loading the index
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, index), f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        return index
+
+    def get_single(self, lemma):
+        return self.single.get(lemma, [])
+
+    def get_gapped(self, first, last):
+        return self.gapped.get(first, {}).get(last, [])
+
+    def match(self, lemmas, words, tags):
+        '''
+            Finds the indicators of a sentence in one pass over its tokens
+
+            A token matches an indicator lemma by its lemma or its lower-cased form (the
+            rules file has some inflected forms, e.g. caused), and single and gapped
+            lexemes also by their part of speech. At each token the longest multiword
+            indicator is taken, and the tokens it covers are not single indicators.
+            A gapped indicator is matched from its last part to the closest preceding
+            first part.
+
+            :params
+                lemmas, words, tags: lemmas, lower-cased texts and tags of the tokens
+            :returns
+                (parts, indicator) sorted by start, where parts are the (start, end) token
+                ranges of the indicator, end exclusive (two ranges for gapped indicators)
+        '''
+        keys = [token_keys(lemma, word) for lemma, word in zip(lemmas, words)]
+
+        matches = []
+        # last part lemma -> {first part lemma : (position, indicators)} of the first parts seen
+        open_gapped = {}
+        covered = 0
+        for i, tag in enumerate(tags):
+            for key in keys[i]:
+                first_parts = open_gapped.get(key)
+                if not first_parts:
+                    continue
+                for first, (position, indicators) in list(first_parts.items()):
+                    allowed = [indicator for indicator in indicators if pos_allowed(indicator.lexeme[-1]['pos'], tag)]
+                    if allowed:
+                        matches.extend(([(position, position + 1), (i, i + 1)], indicator) for indicator in allowed)
+                        del first_parts[first]
+
+            for key in keys[i]:
+                for last, indicators in self.gapped.get(key, {}).items():
+                    allowed = [indicator for indicator in indicators if pos_allowed(indicator.lexeme[0]['pos'], tag)]
+                    if allowed:
+                        open_gapped.setdefault(last, {})[key] = (i, allowed)
+
+            if i < covered:
+                continue
+
+            end, indicators = self.longest_multiword(keys, i)
+            if end is not None:
+                matches.extend(([(i, end)], indicator) for indicator in indicators)
+                covered = end
+                continue
+
+            for key in keys[i]:
+                matches.extend(([(i, i + 1)], indicator) for indicator in self.single.get(key, ())
+                               if pos_allowed(indicator.lexeme[0]['pos'], tag))
+
+        matches.sort(key = lambda match: match[0][0][0])
+        return matches
+
+    def longest_multiword(self, keys, start):
+        '''
+            Longest walk down the trie from start, the depth of the trie bounds the walk
+
+            :returns
+                (end, indicators) or (None, None)
+        '''
+        end = None
+        indicators = None
+
+        nodes = [self.multiword]
+        cur = start
+        while nodes and cur < len(keys):
+            nodes = [node[key] for node in nodes for key in keys[cur] if key in node]
+            cur += 1
+            for node in nodes:
+                if INDICATORS_KEY in node:
+                    end = cur
+                    indicators = node[INDICATORS_KEY]
+                    break
+
+        return end, indicators
+
+    def get_multiword(self, lemmas):
+        node = self.multiword
+        for lemma in lemmas:
+            node = node.get(lemma)
+            if node is None:
+                return []
+        return node.get(INDICATORS_KEY, [])
+
+def lemma_tokens(lemma):
+    return [sys.intern(token) for token in LEMMA_PATTERN.findall(lemma.lower())]
+
+def token_keys(lemma, word):
+    lemma = lemma.lower()
+    if lemma == word:
+        return (lemma,)
+    return (lemma, word)
+
+def pos_allowed(pos, tag):
+    '''
+        Does a token tag match the part of speech of a lexeme (VB matches all verb tags,
+        VBN only VBN, an empty part of speech matches any tag)
+    '''
+    pos = pos.strip()
+    return pos == '' or tag == pos or (len(pos) == 2 and tag[:2] == pos)
+
+def indicator_lemmas(indicator):
+    '''
+        Lemma tokens of a single or multiword indicator in text order
+    '''
+    lexemes = indicator.lexeme
+    if indicator.lexeme_type == 'multiword':
+        string = indicator.string.lower()
+        lexemes = sorted(lexemes, key = lambda lexeme: string.find(lexeme['lemma'].lower()))
+
+    lemmas = []
+    for lexeme in lexemes:
+        lemmas.extend(lemma_tokens(lexeme['lemma']))
+    return lemmas
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the indicator index of a SemRep rules file.')
+    parser.add_argument('semrules_path', type=str, help='SemRep rules file (e.g. resources/semrules2020.xml)')
+    parser.add_argument('index_path', type=str, help='Path of the index file to write')
+
+    args = parser.parse_args()
+
+    index = IndicatorIndex.load(args.semrules_path, args.index_path)
+    print(f'{len(index.indicators)} indicators', file = sys.stderr)
@@ -1,6 +1,14 @@
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import queue
 import re
 import subprocess
+import sys
+
+import pexpect
+
+from cache import LookupCache, MISSING
 
 POS_MAPPINGS = {
     'CC' : ['conj'],
@@ -46,6 +54,11 @@ DISALLOWED_MATCHES = {
     'lower' : 'lour'
 }
 
+# lexAccess writes one XML document per input term; a record set either ends with
+# the closing tag or is written as an empty element when nothing matched
+LEXRECORDS_END = r'</lexRecords>|<lexRecords\s*/>'
+LEXRECORDS_PATTERN = re.compile(r'<lexRecords\s*/>|<lexRecords>.*?</lexRecords>', re.DOTALL)
+
 class LexRecord:
     """
     Sample XMl record:
@@ -65,49 +78,335 @@ class LexRecord:
         </nounEntry>
     </lexRecord>
     """
-    def __init__(self, record_xml):
-        self.base = record_xml.find('base').text
-        self.eui = record_xml.find('eui').text
-        self.cat = record_xml.find('cat').text
-        #self.spelling_vars = record_xml.find('spellingVars').text
+    # documents keep thousands of these, so no per-instance __dict__
+    __slots__ = ('base', 'eui', 'cat', 'infl_vars')
 
-        # let's keep these two as XML for now
-        #self.infl_vars = record_xml.find('inflVars')
+    def __init__(self, base, eui, cat, infl_vars = None):
+        self.base = base
+        self.eui = eui
+        self.cat = cat
+        # (inflected form, inflection) pairs, only kept if requested
+        self.infl_vars = infl_vars
+        #self.spelling_vars = record_xml.find('spellingVars').text
         #self.noun_entry = record_xml.find('nounEntry')
 
+def read_lexrecords(response, infl_vars = False):
+    '''
+        Pulls the lexical records out of a <lexRecords> document
+
+        Only base, eui, cat (and optionally the inflection variants) are kept; every
+        record element is discarded as soon as it has been read.
+
+        :returns
+            list of LexRecord, or None if the document has no records
+    '''
+    if isinstance(response, bytes):
+        response = response.decode('utf-8')
+
+    parser = ET.XMLPullParser(events = ('end',))
+    parser.feed(response.strip())
+    parser.close()
+
+    lexrecords = []
+    fields = {}
+    variants = []
+    for _, element in parser.read_events():
+        tag = element.tag
+        if tag == 'base' or tag == 'eui' or tag == 'cat':
+            if tag not in fields:
+                fields[tag] = element.text
+        elif tag == 'inflVars':
+            if infl_vars:
+                variants.append((element.text, element.get('infl')))
+        elif tag == 'lexRecord':
+            lexrecords.append(LexRecord(fields.get('base'), fields.get('eui'), sys.intern(fields.get('cat', '')),
+                                        variants if infl_vars else None))
+            fields = {}
+            variants = []
+            element.clear()
+
+    if len(lexrecords) == 0:
+        return None
+    return lexrecords
+
+def normalize_text(text):
+    return re.sub(r'\W+', ' ', text)
+
+def split_lexrecords(output, count):
+    '''
+        Splits the output of a multi-term lexAccess run into one <lexRecords> document per term
+    '''
+    if isinstance(output, bytes):
+        output = output.decode('utf-8')
+
+    documents = LEXRECORDS_PATTERN.findall(output)
+    if len(documents) != count:
+        raise ValueError(f'Expected {count} lexRecords documents, received {len(documents)}')
+    return documents
+
 
 import functools
 
+class LexAccessSession:
+    '''
+        Long-lived lexAccess process that reads one term per line from stdin.
+
+        Every lookup is framed by the end of its <lexRecords> document, so a single
+        JVM serves any number of lookups. A process that stops answering is killed
+        and spawned again. A term that made the process time out (or exit twice) is
+        not sent again, its lookups fail at once.
+    '''
+    def __init__(self, path, timeout = 10, failed_texts = None):
+        '''
+            :params
+                failed_texts: set of the terms that failed, shared by the sessions of a pool
+        '''
+        self.path = path
+        self.timeout = timeout
+        self.failed_texts = failed_texts if failed_texts is not None else set()
+        self.process = None
+
+        self.start()
+
+    def start(self):
+        self.process = pexpect.spawn(f'{self.path} -f:id -f:x', encoding = 'utf-8', timeout = self.timeout)
+        self.process.setecho(False)
+        # pexpect sleeps before every send by default
+        self.process.delaybeforesend = None
+
+    def close(self):
+        if self.process is not None and self.process.isalive():
+            self.process.terminate(force = True)
+        self.process = None
+
+    def restart(self):
+        self.close()
+        self.start()
+
+    def lookup(self, text):
+        if text in self.failed_texts:
+            raise RuntimeError(f'LexAccess failed on this term before: {text}')
+
+        try:
+            return self.send(text)
+        except pexpect.EOF:
+            # the process may have exited before this term was sent, it is sent once more
+            print(f'LexAccess session exited, restarting: {self.path}')
+            self.restart()
+        except pexpect.TIMEOUT:
+            self.fail(text)
+
+        try:
+            return self.send(text)
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            self.fail(text)
+
+    def fail(self, text):
+        print(f'LexAccess session not responding, restarting: {self.path}')
+        self.failed_texts.add(text)
+        self.restart()
+        raise RuntimeError(f'LexAccess did not answer: {text}')
+
+    def lookup_many(self, texts):
+        # terms are sent one at a time; writing all of them before reading
+        # could fill the terminal buffers and block both sides
+        return [self.lookup(text) for text in texts]
+
+    def send(self, text):
+        # clear any pending output (e.g. the startup banner or a late answer)
+        try:
+            while True:
+                self.process.read_nonblocking(2048, 0)
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            pass
+
+        self.process.sendline(text)
+        self.process.expect(LEXRECORDS_END)
+
+        output = self.process.before + self.process.after
+        return output[output.rfind('<lexRecords'):]
+
+class LexAccessPool:
+    '''
+        Fixed set of LexAccess sessions shared by concurrent callers.
+    '''
+    def __init__(self, path, size = 1, timeout = 10):
+        self.size = size
+        self.sessions = queue.Queue()
+        failed_texts = set()
+        for _ in range(size):
+            self.sessions.put(LexAccessSession(path, timeout, failed_texts))
+        self.executor = ThreadPoolExecutor(max_workers = size)
+
+    def lookup(self, text):
+        session = self.sessions.get()
+        try:
+            return session.lookup(text)
+        finally:
+            self.sessions.put(session)
+
+    def lookup_many(self, texts):
+        # spread the terms over all sessions
+        batch_size = -(-len(texts) // self.size)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        results = []
+        for batch_results in self.executor.map(self.lookup_batch, batches):
+            results.extend(batch_results)
+        return results
+
+    def lookup_batch(self, texts):
+        session = self.sessions.get()
+        try:
+            return session.lookup_many(texts)
+        finally:
+            self.sessions.put(session)
+
+    def close(self):
+        self.executor.shutdown()
+        while not self.sessions.empty():
+            self.sessions.get().close()
+
 class LexAccess():
-    def __init__(self, path):
+    # version of the parsed lexical records (see cache_key), increase when LexRecord or read_lexrecords change
+    lexrecord_format = 1
+
+    def __init__(self, path, mode = 'subprocess', workers = 1, timeout = 10, cache_size = 100000, cache_path = None,
+                 infl_vars = False, version = ''):
+        '''
+            :params
+                path: path to the lexAccess launcher (the server URI in server mode)
+                mode: subprocess (one lexAccess run per lookup), session (resident lexAccess processes)
+                      or server (JSON-RPC server in server/lexaccess/lexaccess.py)
+                workers: number of resident processes in session mode
+                timeout: seconds to wait for a session answer before restarting it
+                cache_size: number of lookups kept in memory (0 disables the memory cache)
+                cache_path: sqlite file to share lookups across runs and processes (optional)
+                infl_vars: keep the inflection variants of the matched records
+                version: version tag of the lexicon (e.g. lexAccess2016), cached lookups of
+                         another version are not reused
+        '''
         self.path = path
+        self.mode = mode
+        self.infl_vars = infl_vars
+        self.version = version
+
+        self.cache = None
+        if cache_size > 0 or cache_path is not None:
+            self.cache = LookupCache(cache_size, cache_path)
+
+        self.sessions = None
+        self.server = None
+        if mode == 'session':
+            self.sessions = LexAccessPool(path, workers, timeout)
+        elif mode == 'server':
+            from jsonrpclib.jsonrpc import ServerProxy
+            self.server = ServerProxy(path)
+        elif mode != 'subprocess':
+            raise ValueError(f'Unknown LexAccess mode: {mode}')
 
     def normalize_text(self, text):
         # print(f'lookup:{text}')
         # ctext=text.replace('(','').replace(')','').replace('>','').replace('<','')
-        return re.sub(r'\W+', ' ', text)
+        return normalize_text(text)
+
+    def cache_key(self, ctext):
+        # lookups cached with another record format or configuration are not reused
+        return hashlib.sha1(f'{self.lexrecord_format}\0{self.version}\0{self.infl_vars}\0{ctext}'.encode('UTF-8')).hexdigest()
 
-    #@functools.lru_cache(maxsize = None)
     def get_matches(self, text):
         ctext= self.normalize_text(text).strip()
         print(f'lookup:{text}:[{ctext}]')
 
-        if len(ctext) > 0:
+        if len(ctext) == 0:
+            return None
+
+        # misses are cached too (as None), most probes of the lexmatcher fail
+        if self.cache is not None:
+            lexrecords = self.cache.get(self.cache_key(ctext))
+            if lexrecords is not MISSING:
+                return lexrecords
+
+        try:
+            lexrecords = self.parse_response(self.lookup(ctext))
+        except Exception as e:
+            # errors are not cached, the next lookup tries again
+            print(e)
+            print(f'LexAccess error: {e}')
+            return None
+
+        if lexrecords is not None:
+            print(f'matched: {text}')
+
+        if self.cache is not None:
+            self.cache.set(self.cache_key(ctext), lexrecords)
+        return lexrecords
+
+    def get_matches_batch(self, texts):
+        '''
+            Looks up many texts with a single lexAccess round trip
+
+            :params
+                texts: texts to look up (e.g. all candidate n-grams of a sentence)
+            :returns
+                dict of text -> list of LexRecord (None if the text has no match)
+        '''
+        matches = {}
+        pending = {}
+        for text in texts:
+            if text in matches:
+                continue
+
+            ctext = self.normalize_text(text).strip()
+            matches[text] = None
+            if len(ctext) == 0:
+                continue
+
+            if self.cache is not None:
+                lexrecords = self.cache.get(self.cache_key(ctext))
+                if lexrecords is not MISSING:
+                    matches[text] = lexrecords
+                    continue
+
+            pending.setdefault(ctext, []).append(text)
+
+        if len(pending) == 0:
+            return matches
+
+        ctexts = list(pending.keys())
+        try:
+            responses = self.lookup_many(ctexts)
+        except Exception as e:
+            # fall back to one lookup per text
+            print(f'LexAccess batch error: {e}')
+            for ctext, ctext_texts in pending.items():
+                for text in ctext_texts:
+                    matches[text] = self.get_matches(text)
+            return matches
+
+        for ctext, response in zip(ctexts, responses):
             try:
-                match = self.lookup(ctext)
-                tree = ET.ElementTree(ET.fromstring(match.strip()))
-                root = tree.getroot()
-
-                lexrecords_xml = root.findall('lexRecord')
-                if len(lexrecords_xml) > 0:
-                    print(f'matched: {text}')
-                    return lexrecords_xml
+                lexrecords = self.parse_response(response)
             except Exception as e:
-                print(e)
                 print(f'LexAccess error: {e}')
-        return None
+                continue
+
+            if self.cache is not None:
+                self.cache.set(self.cache_key(ctext), lexrecords)
+            for text in pending[ctext]:
+                matches[text] = lexrecords
+
+        return matches
+
+    def parse_response(self, response):
+        return read_lexrecords(response, self.infl_vars)
 
     def lookup(self, text):  # could make a parse method in class below
+        if self.sessions is not None:
+            return self.sessions.lookup(text)
+        if self.server is not None:
+            return self.server.parse(text)
+
         #command = f'echo {text} | {self.path} -f:id -f:x'
         # match = os.popen(command).read()
         echo_cmd = subprocess.Popen(('echo', text), stdout = subprocess.PIPE)
@@ -117,18 +416,35 @@ class LexAccess():
 
         return output
 
-    # convert lex records xml to list of lex records object
-    # perform text and pos filtering in this step too
-    def parse_lexrecords(self, lexrecords_xml, text, allowed_pos = None):
-        lexrecords = []
-        for record_xml in lexrecords_xml:
-            lexrecord = LexRecord(record_xml)
-            if text in DISALLOWED_MATCHES and lexrecord.base == DISALLOWED_MATCHES[text]:
-                continue
-            if allowed_pos is not None and lexrecord.cat not in POS_MAPPINGS[allowed_pos]:
-                continue
+    def lookup_many(self, texts):
+        if self.sessions is not None:
+            return self.sessions.lookup_many(texts)
+        if self.server is not None:
+            return self.server.parse_many(texts)
 
-            lexrecords.append(lexrecord)
-        return lexrecords
+        # a single lexAccess run answers one term per input line
+        output = subprocess.check_output((self.path, '-f:id -f:x'), input = '\n'.join(texts).encode('utf-8') + b'\n',
+                                         stderr = subprocess.DEVNULL)
+        return split_lexrecords(output, len(texts))
+
+    def close(self):
+        if self.sessions is not None:
+            self.sessions.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def parse_lexrecords(self, lexrecords, text, allowed_pos = None):
+        return filter_lexrecords(lexrecords, text, allowed_pos)
 
+# filter the lex records of a match
+# perform text and pos filtering in this step
+def filter_lexrecords(lexrecords, text, allowed_pos = None):
+    filtered_lexrecords = []
+    for lexrecord in lexrecords:
+        if text in DISALLOWED_MATCHES and lexrecord.base == DISALLOWED_MATCHES[text]:
+            continue
+        if allowed_pos is not None and lexrecord.cat not in POS_MAPPINGS[allowed_pos]:
+            continue
 
+        filtered_lexrecords.append(lexrecord)
+    return filtered_lexrecords
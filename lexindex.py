@@ -0,0 +1,118 @@
+import argparse
+import pickle
+import sys
+
+from lexaccess import LexRecord, filter_lexrecords, normalize_text
+from tokentrie import longest_match, trie_add, trie_find
+
+class LexIndex:
+    '''
+        In-memory replacement for LexAccess built from a local SPECIALIST lexicon dump.
+
+        The lexicon is stored as a token trie (see tokentrie.py): the node reached by
+        the last token of a term holds the lexicon records of that term. Records are
+        (base, eui, cat) tuples, so no subprocess or XML is needed to answer a lookup.
+
+        LexIndex answers the lookups of the lexmatcher component like LexAccess
+        (get_matches, get_matches_batch, parse_lexrecords); lookups are not cached,
+        they are cheaper than a cache query.
+    '''
+    def __init__(self, path):
+        '''
+            :params
+                path: pickled index written by LexIndex.save (see build_index below)
+        '''
+        self.path = path
+        self.mode = 'index'
+        self.cache = None
+
+        with open(path, 'rb') as f:
+            self.trie = pickle.load(f)
+
+    def find(self, tokens):
+        return trie_find(self.trie, tokens)
+
+    def get_matches(self, text):
+        records = self.find(tokenize(text))
+        if records is None:
+            return None
+        return [LexRecord(*record) for record in records]
+
+    def get_matches_batch(self, texts):
+        '''
+            :returns
+                dict of text -> list of LexRecord (None if the text has no match)
+        '''
+        return {text : self.get_matches(text) for text in texts}
+
+    def parse_lexrecords(self, lexrecords, text, allowed_pos = None):
+        return filter_lexrecords(lexrecords, text, allowed_pos)
+
+    def close(self):
+        pass
+
+    def longest_matches(self, words):
+        '''
+            Finds the longest lexicon terms in a sentence in a single left-to-right pass
+
+            :params
+                words: token texts of the sentence; None marks a token that cannot be part
+                       of a term (e.g. punctuation) and stops any match running over it
+            :returns
+                (start, end, lexrecords) for each match, end exclusive
+        '''
+        word_tokens = [tokenize(word) if word is not None else None for word in words]
+
+        matches = []
+        start = 0
+        while start < len(words):
+            end, records = longest_match(self.trie, word_tokens, start)
+            if end is None:
+                start += 1
+            else:
+                matches.append((start, end, [LexRecord(*record) for record in records]))
+                start = end
+
+        return matches
+
+    @staticmethod
+    def save(trie, path):
+        with open(path, 'wb') as f:
+            pickle.dump(trie, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+def tokenize(text):
+    return normalize_text(text).lower().split()
+
+def build_index(table_path):
+    '''
+        Builds the token trie from an inflection table of the SPECIALIST lexicon
+
+        Each line of the table has the pipe-separated fields
+        inflVar|cat|infl|eui|unInfl|citation
+        (the format of lexAccess' inflVars table); every inflected form is indexed
+        and points to the (citation, eui, cat) of its lexical record.
+    '''
+    trie = {}
+    with open(table_path, 'r', encoding = 'utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('|')
+            if len(fields) < 6:
+                continue
+
+            infl_var, cat, _, eui, _, citation = fields[:6]
+            tokens = tokenize(infl_var)
+            if len(tokens) == 0:
+                continue
+
+            trie_add(trie, tokens, (citation, eui, sys.intern(cat)))
+
+    return trie
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the offline lexicon index used by the lexmatcher.')
+    parser.add_argument('table_path', type=str, help='SPECIALIST lexicon inflection table (inflVar|cat|infl|eui|unInfl|citation)')
+    parser.add_argument('index_path', type=str, help='Path of the index file to write')
+
+    args = parser.parse_args()
+
+    LexIndex.save(build_index(args.table_path), args.index_path)
@@ -8,6 +8,7 @@ import configparser
 
 import json
 import nltk
+from concurrent.futures import ThreadPoolExecutor
 from medline import *
 from string import punctuation
 
@@ -18,6 +19,7 @@ from socketclient import *
 from serverproxyclient import *
 from srindicator import *
 from spacy_components import *
+from spans import fuse_spans
 
 import spacy
 spacy.load('en_core_sci_sm')
@@ -33,50 +35,37 @@ def get_concept(term, concepts):
     else:
         return None
 
+# shared by all documents; the ontology servers are queried in parallel threads
+annotation_executor = ThreadPoolExecutor(max_workers = 4)
+
 #hierarchy: first mention (e.g. GNormPlus over MetamapLite)
 def referential_analysis(text, ontologies = [GNormPlus, MetamapLite]):
     #import json
-    processes = {}
-    with Pool(processes = len(ontologies)) as pool:
-        for ontology in ontologies:
-            processes[ontology.__name__] = pool.apply_async(ontology(servers['host'],
-                                             servers[ontology.__name__.lower() + '_port']).annotate, args = (text,))
+    futures = {}
+    for ontology in ontologies:
+        futures[ontology.__name__] = annotation_executor.submit(ontology(servers['host'],
+                                         servers[ontology.__name__.lower() + '_port'],
+                                         **get_client_options(servers, ontology.__name__.lower())).annotate, text)
 
-        annotations = {}
-        for ontology in ontologies:
-            annotations[ontology.__name__] = processes[ontology.__name__].get()
+    annotations = {}
+    for ontology in ontologies:
+        annotations[ontology.__name__] = futures[ontology.__name__].result()
 
     # wsd -> THIS DOES NOT WORK AGAIN -- NEED TO RECHECK
     # WSD(servers['host'], servers[ontology.__name__.lower() + '_port']).disambiguate(annotations['MetamapLite'], text)
 
-    span_lengths = {}
+    # the first ontology to annotate a span wins
+    span_concepts = {}
     for ontology in ontologies:
         for (start, length), concept in annotations[ontology.__name__].items():
-            if length not in span_lengths:
-                span_lengths[length]  = {}
-            if (start, start + length) not in span_lengths[length]:
-                span_lengths[length][(start, start + length)] = concept
-
-    sorted_span_lengths = list(span_lengths.keys())
-    sorted_span_lengths.sort(reverse = True)
+            if (start, start + length) not in span_concepts:
+                span_concepts[(start, start + length)] = concept
 
     merged_annotations = {}
     t_annotations = {}
-    for span_length in sorted_span_lengths:
-        for (start, end), concept in span_lengths[span_length].items():
-            cur_span_range = set(range(start, end))
-
-            merge = True
-            for (merged_start, merged_end) in merged_annotations.keys():
-                merged_span_range = set(range(merged_start, merged_end))
-                if len(cur_span_range.intersection(merged_span_range)) > 0:
-                    # print(f'DONT ADD: {(start, end)}')
-                    print(f'DONT ADD: {(start, end)}')
-                    merge = False
-                    break
-            if merge:
-                merged_annotations[(start, end)] = concept
-                t_annotations[f't{start}_{end}'] = concept
+    for start, end in fuse_spans(span_concepts):
+        merged_annotations[(start, end)] = span_concepts[(start, end)]
+        t_annotations[f't{start}_{end}'] = span_concepts[(start, end)]
 
     with open("an.tmp", 'a') as f:
         f.write(json.dumps(t_annotations,indent=2)) #error, have2change
@@ -171,10 +160,10 @@ def interNP_hypernymy(spacy_sent, np_chunks, concepts, max_distance = 5):
 
 def hypernymy(concept_1, concept_2, both_directions = True):
     # get the common semantic groups of the concepts
-    sem_groups = set(concept_1['semgroups']).intersection(set(concept_2['semgroups']))
+    sem_groups = concept_1.semgroup_mask & concept_2.semgroup_mask
 
     # proceed if there are any common sem groups that are not 'anat' or 'conc'
-    if len(sem_groups - set(['anat', 'conc'])) == 0:
+    if sem_groups & ~NON_HYPERNYM_SEMGROUPS == 0:
         return None
 
     socket_client = SocketClient(HOST, HIERARCHY_PORT)
@@ -439,8 +428,25 @@ def process_text(text):
     if text is None:
         return None
 
+    return process_doc(spacynlp(text))
+
+def process_texts(texts):
+    """Processes text documents in batches (see ConceptMatchComponent.pipe)
+
+    Args:
+        texts (iterable of str): documents to process, None entries are skipped
+    """
+    for doc in spacynlp.pipe(text for text in texts if text is not None):
+        process_doc(doc)
+
+def process_doc(doc):
+    """Writes the output of a processed document
+
+    Args:
+        doc (spacy.tokens.Doc): document processed by the pipeline
+    """
+    text = doc.text
     print(f'Processing: {text}')
-    doc = spacynlp(text)
 
     with open('test_output/test.txt', 'w') as o:
         o.write(f'{doc.text}\n')
@@ -477,7 +483,7 @@ def process_text(text):
         # sentence = Sentence(config)
         # sentence.spacy = spacynlp(sentence_text)
         # sentence.surface_elements = lexaccess.get_matches(sentence.spacy)
-        # sentence.indicators = annotate_indicators(sentence.spacy, srindicators_list, srindicator_lemmas)
+        # sentence.indicators: see the srindicator pipeline component
         #
         # concepts = referential_analysis(text)
 #<<<<<<< Updated upstream
@@ -504,13 +510,32 @@ def setup_nlp_config(nlp_config):
     global spacynlp
     spacynlp = spacy.load(nlp_config['spacy'])
     spacynlp.add_pipe('lexmatcher', after='parser',
-                      config={'path': nlp_config['lexaccess_path']})
-    spacynlp.add_pipe('concept_match', after = 'lexmatcher',
-                      config = {'ontologies' : nlp_config['ontologies'], 'server_paths' : servers})
+                      config={'path': nlp_config['lexaccess_path'],
+                              'mode': nlp_config.get('lexaccess_mode', 'subprocess'),
+                              'workers': int(nlp_config.get('lexaccess_workers', 1)),
+                              'index_path': nlp_config.get('lexicon_index'),
+                              'cache_size': int(nlp_config.get('lexaccess_cache_size', 100000)),
+                              'cache_path': nlp_config.get('lexaccess_cache_path'),
+                              'max_ngram': int(nlp_config.get('lexaccess_max_ngram', 0)),
+                              'version': nlp_config.get('lexaccess_version', '')})
+    spacynlp.add_pipe('srindicator', after = 'lexmatcher', config = semrules_config)
+    global indicator_index
+    global srindicators_list
+    global srindicator_lemmas
+    indicator_index = spacynlp.get_pipe('srindicator').indicator_index
+    srindicators_list, srindicator_lemmas = indicator_index.indicators, indicator_index.lemmas
+    spacynlp.add_pipe('concept_match', after = 'srindicator',
+                      config = {'ontologies' : nlp_config['ontologies'], 'server_paths' : servers,
+                                'concept_table' : nlp_config.get('concept_table')})
     spacynlp.add_pipe('chunker', after = 'concept_match',
-                      config = {'path' : nlp_config['chunker_path']})
+                      config = {'chunker' : nlp_config.get('chunker', 'opennlp'),
+                                'path' : nlp_config.get('chunker_path'),
+                                'workers' : int(nlp_config.get('chunker_workers', 1)),
+                                'batch_size' : int(nlp_config.get('chunker_batch_size', 32))})
     spacynlp.add_pipe('harmonizer', after='chunker')
-    spacynlp.add_pipe('hypernym_analysis', after='harmonizer')
+    spacynlp.add_pipe('hypernym_analysis', after='harmonizer',
+                      config = {'server_paths' : servers,
+                                'hierarchy_index' : nlp_config.get('hierarchy_index')})
     # spacynlp.add_pipe('relational_analysis', after='hypernym_analysis',
     #                   config = {'ontology_db_path' : ontology_db})
     #
@@ -523,9 +548,9 @@ def setup_semrep_config(semrep_config):
     Args:
         semrep_config (dict or configparser.SectionProxy): file paths of rules/databases
     """
-    global srindicators_list
-    global srindicator_lemmas
-    srindicators_list, srindicator_lemmas = parse_semrules_file(semrep_config['semrules'])
+    # the indicator index is loaded once, by the srindicator component (see setup_nlp_config)
+    global semrules_config
+    semrules_config = {'semrules' : semrep_config['semrules'], 'semrules_cache' : semrep_config.get('semrules_cache')}
 
     global ontology_db
     ontology_db = semrep_config['ontology_db']
@@ -570,15 +595,19 @@ def process_file(input_file_format, input_file_path, output_file_path = None, mu
     elif input_file_format == 'medline':
         docs = parse_medline_file(input_file_path)
     elif input_file_format == 'medlinexml':
-        docs = parse_medlinexml_file(input_file_path)
+        docs = parse_medlinexml_file(input_file_path, config['I/O'].getboolean('skip_no_abstract', fallback = False))
+
+    # titles and abstracts go through the pipeline together so that concept requests are batched
+    process_texts(get_texts(docs))
 
+def get_texts(docs):
     for doc in docs:
         # print('PMID: {}'.format(doc.PMID))
         # print('Title: {}'.format(doc.title))
         print(f'PMID: {doc.PMID},Title: {doc.title}')
         if doc.title is not None:
-            process_text(doc.title)
-        process_text(doc.abstract)
+            yield doc.title
+        yield doc.abstract
 
 def process_interactive(output_path = None):
     """Repeatedly processes a single line of input until user enters quit
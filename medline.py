@@ -1,3 +1,5 @@
+import gzip
+
 from lxml import etree
 
 class MedlineDocument:
@@ -27,22 +29,39 @@ class MedlineDocument:
             self.abstract += text.xpath('string(.)').strip() + ' '
         self.abstract = self.abstract.strip()
 
+def open_text_file(file_path):
+    # .gz files are decompressed while reading
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt')
+    return open(file_path, 'r')
+
 def read_plaintext_file(file_path):
-    with open(file_path, 'r') as f:
-        return [MedlineDocument(doc) for doc in f.readlines() if doc != '\n']
+    '''
+        Yields a MedlineDocument for each non-empty line (title and abstract)
+    '''
+    with open_text_file(file_path) as f:
+        for doc in f:
+            if doc.strip() != '':
+                yield MedlineDocument(doc)
 
 def parse_medline_file(file_path):
-    medline_docs = list() # list of medline documents
-    with open(file_path, 'r') as f:
-        doc = {}
+    '''
+        Yields a MedlineDocument for each citation of a MEDLINE file, reading one
+        citation at a time (citations are separated by empty lines)
 
-        lines = f.readlines()
-        for i, line in enumerate(lines):
-            # if line is empty or end of file is reached, add current doc to doc list
-            if line == '\n' or i + 1 == len(lines):
+        A continuation line before the first field of a citation raises a ValueError
+        with its line number, when it is reached.
+    '''
+    with open_text_file(file_path) as f:
+        doc = {}
+        field = None
+        for line_number, line in enumerate(f, 1):
+            # if line is empty, the current doc is complete
+            if line.strip() == '':
                 if doc != {}:
-                    medline_docs.append(MedlineDocument(doc))
+                    yield MedlineDocument(doc)
                     doc = {}
+                    field = None
                 continue
 
             # if 5th character is a dash, it is the start of a new field
@@ -58,17 +77,41 @@ def parse_medline_file(file_path):
                     doc[field] = [data]
                 else:
                     doc[field].append(data)
+            elif field is None:
+                raise ValueError(f'{file_path}, line {line_number}: continuation line outside of a field: {line.strip()}')
             else:
                 doc[field][len(doc[field]) - 1] += ' ' + line.strip()
 
-    return medline_docs
+        # end of file
+        if doc != {}:
+            yield MedlineDocument(doc)
+
+def parse_medlinexml_file(file_path, skip_no_abstract = False):
+    '''
+        Yields a MedlineDocument for each MedlineCitation of a MEDLINE/PubMed XML file
+        (e.g. a PubMed baseline file, .xml or .xml.gz)
+
+        The file is parsed incrementally; each citation is freed once it is read,
+        together with the elements before it, so memory does not grow with the file.
 
-def parse_medlinexml_file(file_path):
-    medline_xml = etree.parse(file_path)
-    root = medline_xml.getroot()
+        :params
+            skip_no_abstract: skip the citations without an abstract
+    '''
+    if file_path.endswith('.gz'):
+        f = gzip.open(file_path, 'rb')
+    else:
+        f = open(file_path, 'rb')
 
-    medline_docs = list()
-    for doc in root.findall('PubmedArticle/MedlineCitation'):
-        medline_docs.append(MedlineDocument(doc))
+    with f:
+        for event, citation in etree.iterparse(f, events = ('end',), tag = 'MedlineCitation'):
+            if not skip_no_abstract or citation.find('Article/Abstract') is not None:
+                yield MedlineDocument(citation)
 
-    return medline_docs
+            citation.clear(keep_tail = True)
+            # previous siblings of the citation and of its ancestors (earlier articles
+            # and their PubmedData) are complete and no longer needed
+            element = citation
+            while element.getparent() is not None:
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+                element = element.getparent()
@@ -1,13 +1,37 @@
+from bisect import bisect_right
+from concepts import ScoredConcept
 from socketclient import SocketClient
 
+# number of fields of a concept in a response
+CONCEPT_FIELDS = 6
+
+# separates the documents of a batch request
+# the server reads a single line, so it cannot contain a line break, and it is only
+# punctuation (other than the ;; and ,, of the response format) so that no concept is matched on it
+BATCH_DELIMITER = ' ||| '
+
 class MetamapLite:
-    def __init__(self, host, port):
+    # version of the parsed annotations (see CachedAnnotator)
+    annotation_format = 2
+
+    def __init__(self, host, port, batch_bytes = 0, **client_options):
+        '''
+            :params
+                batch_bytes: maximum size of a batch request in bytes, 0 to send one request
+                             per document (see annotate_batch)
+        '''
         self.host = host
         self.port = port
+        self.batch_bytes = batch_bytes
+        self.client_options = client_options
+        if batch_bytes > 0:
+            # annotations of joined documents may differ from those of single documents,
+            # they are not cached with them
+            self.annotation_format = f'{MetamapLite.annotation_format}-batched'
 
     def annotate(self, text):
         import json
-        socket_client = SocketClient(self.host, self.port)
+        socket_client = SocketClient(self.host, self.port, **self.client_options)
         annotations = socket_client.send(text)
         # print(annotations)
         print(f'annotate:{type(annotations)}')
@@ -21,14 +45,62 @@ class MetamapLite:
             #f.write(annotations2)
         return self.parse_annotations(annotations)
 
+    def annotate_batch(self, texts):
+        '''
+            Annotates several documents, with as few requests as possible if batch_bytes is set
+
+            Documents are joined with BATCH_DELIMITER into requests of at most batch_bytes
+            (a longer document is sent on its own) and the returned spans are mapped back
+            to their document. Spans that cross a document boundary are dropped. The server
+            sees the text around each document (sentence splitting, abbreviations and
+            negation may change), so batching is opt-in.
+
+            :returns
+                list of annotations, one per text, in the format of annotate
+        '''
+        if self.batch_bytes <= 0:
+            return [self.annotate(text) for text in texts]
+
+        annotations = []
+        batch = []
+        batch_bytes = 0
+        for text in texts:
+            # line breaks would end the request, a space keeps the offsets
+            text = text.replace('\r', ' ').replace('\n', ' ')
+            text_bytes = len(text.encode('UTF-8')) + len(BATCH_DELIMITER)
+            if batch and batch_bytes + text_bytes > self.batch_bytes:
+                annotations.extend(self.annotate_joined(batch))
+                batch = []
+                batch_bytes = 0
+            batch.append(text)
+            batch_bytes += text_bytes
+
+        if batch:
+            annotations.extend(self.annotate_joined(batch))
+        return annotations
+
+    def annotate_joined(self, texts):
+        # character offset of each document in the joined text
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(BATCH_DELIMITER)
+
+        joined_annotations = self.annotate(BATCH_DELIMITER.join(texts))
+
+        annotations = [{} for text in texts]
+        for (start, length), concepts in joined_annotations.items():
+            i = bisect_right(starts, start) - 1
+            if i < 0 or start + length > starts[i] + len(texts[i]):
+                continue
+            annotations[i][(start - starts[i], length)] = concepts
+        return annotations
+
     def parse_annotations(self, annotations):
-        # format: {(start, length) : list<ScoredUMLSConcept>}
+        # format: {(start, length) : list<ScoredConcept>}
         parsed_annotations = {}
 
-        field_names = ['cui', 'name', 'concept_string', 'score', 'semtypes', 'semgroups']
-
-        # fields that contain a list of strings
-        field_list_objs = ['semtypes', 'semgroups']
         for annotation in annotations.split(";;"):
             if annotation.endswith(',,'):
                 annotation = annotation[:-2]
@@ -42,13 +114,10 @@ class MetamapLite:
             # span of entity in annotations string
             span = (int(field_values[0]), int(field_values[1]))
 
-            # parse all matched concepts
+            # parse all matched concepts (cui, name, concept_string, score, semtypes, semgroups)
             concepts = []
-            for index in range(2, len(field_values), len(field_names)):
-                concept = dict(zip(field_names, field_values[index: index + len(field_names) + 1]))
-                for field_name in field_list_objs:
-                    concept[field_name] = concept[field_name].split('::')
-                concepts.append(concept)
+            for index in range(2, len(field_values) - CONCEPT_FIELDS + 1, CONCEPT_FIELDS):
+                concepts.append(ScoredConcept(*field_values[index: index + CONCEPT_FIELDS]))
 
             parsed_annotations[span] = concepts
 
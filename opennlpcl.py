@@ -1,5 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 import pexpect
+import queue
 
 class OpenNLP():
     def __init__(self, path, tool = 'ChunkerME', model = 'models/en-chunker.bin'):
@@ -12,14 +14,24 @@ class OpenNLP():
         '''
         opennlp = os.path.join(path, 'bin/opennlp')
         model_path = os.path.join(path, model)
-        cmd = '%s %s %s' % (opennlp, tool, model_path)
+        self.cmd = '%s %s %s' % (opennlp, tool, model_path)
 
+        self.start()
+
+    def start(self):
         # Spawn the chunker process
-        self.process = pexpect.spawn(cmd)
+        self.process = pexpect.spawn(self.cmd)
         self.process.setecho(False)
+        # pexpect sleeps before every send by default
+        self.process.delaybeforesend = None
         self.process.expect('done')
         self.process.expect('\r\n')
 
+    def restart(self):
+        if self.process.isalive():
+            self.process.terminate(force = True)
+        self.start()
+
     def parse(self, text):
         # clear any pending output
         try:
@@ -41,4 +53,77 @@ class OpenNLP():
             except:
                 pass
             return False
-        return results.decode('utf-8')
\ No newline at end of file
+        return results.decode('utf-8')
+
+    def parse_many(self, texts, window = 16):
+        '''
+            Parses several lines, keeping up to window lines in flight
+
+            The tool answers every line with one line (two for an invalid line), in
+            order. Sending all lines before reading could fill the terminal buffers
+            and block both sides, so reading starts after window lines.
+        '''
+        # clear any pending output
+        try:
+            self.process.read_nonblocking(2048, 0)
+        except:
+            pass
+
+        results = []
+        sent = 0
+        try:
+            while len(results) < len(texts):
+                while sent < len(texts) and sent - len(results) < window:
+                    self.process.sendline(texts[sent])
+                    sent += 1
+
+                text = texts[len(results)]
+                self.process.expect('\r\n', 5 + len(text) / 20.0)
+                output = self.process.before
+                if b'Invalid' in output:
+                    self.process.expect('\r\n', 5)
+                    results.append(False)
+                else:
+                    results.append(output.decode('utf-8'))
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            # answers of the lines in flight are lost, parse the rest one at a time
+            print(f'OpenNLP not responding, restarting: {self.cmd}')
+            self.restart()
+            results.extend(self.parse(text) for text in texts[len(results):])
+
+        return results
+
+class OpenNLPPool():
+    '''
+        Several OpenNLP processes shared by concurrent callers.
+
+        parse_many splits the lines into batches that are parsed by all processes at
+        the same time; each batch keeps its sequence number, so the answers are put
+        back in the order of the lines.
+    '''
+    def __init__(self, path, workers = 1, batch_size = 32, tool = 'ChunkerME', model = 'models/en-chunker.bin'):
+        self.batch_size = batch_size
+        self.processes = queue.Queue()
+        for _ in range(workers):
+            self.processes.put(OpenNLP(path, tool, model))
+        self.executor = ThreadPoolExecutor(max_workers = workers)
+
+    def parse(self, text):
+        return self.parse_batch([text])[0]
+
+    def parse_batch(self, texts):
+        process = self.processes.get()
+        try:
+            return process.parse_many(texts)
+        finally:
+            self.processes.put(process)
+
+    def parse_many(self, texts):
+        futures = {}
+        for sequence, start in enumerate(range(0, len(texts), self.batch_size)):
+            futures[sequence] = self.executor.submit(self.parse_batch, texts[start:start + self.batch_size])
+
+        results = []
+        for sequence in range(len(futures)):
+            results.extend(futures[sequence].result())
+        return results
@@ -0,0 +1,110 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+
+# version of the pickled index, increase when the index changes
+INDEX_VERSION = 2
+
+class PredicateIndex:
+    '''
+        Semantic type constraints of the predicates (e.g. aapp-affects-biof)
+
+        Indexed both by (subject semtype, predicate) -> object semtypes, and by
+        (subject semtype, object semtype) -> predicates, so that all predicates
+        allowed for a pair of semantic types are found with one lookup.
+
+        The constraints are also a boolean array allowed[subject, predicate, object]
+        over the codes in semtype_codes and predicate_codes, to check many pairs
+        with one fancy-indexing operation (see allowed_pairs). The last semtype and
+        predicate codes are for the ones missing from the ontology, which allow nothing.
+    '''
+    def __init__(self, triples = ()):
+        '''
+            :params
+                triples: (subject semtype, predicate, object semtype)
+        '''
+        self.objects = {}
+        self.predicates = {}
+        for subject, predicate, object in triples:
+            subject = sys.intern(subject)
+            predicate = sys.intern(predicate)
+            object = sys.intern(object)
+            self.objects.setdefault((subject, predicate), set()).add(object)
+            self.predicates.setdefault((subject, object), set()).add(predicate)
+
+        semtypes = set()
+        for (subject, object) in self.predicates:
+            semtypes.add(subject)
+            semtypes.add(object)
+        self.semtype_codes = {semtype : code for code, semtype in enumerate(sorted(semtypes))}
+        self.predicate_codes = {predicate : code for code, predicate in
+                                enumerate(sorted(set(predicate for subject, predicate in self.objects)))}
+
+        self.allowed = np.zeros((len(self.semtype_codes) + 1, len(self.predicate_codes) + 1, len(self.semtype_codes) + 1),
+                                dtype = bool)
+        for (subject, predicate), objects in self.objects.items():
+            self.allowed[self.semtype_codes[subject], self.predicate_codes[predicate],
+                         [self.semtype_codes[object] for object in objects]] = True
+
+    @classmethod
+    def load(cls, path, cache_path = None):
+        '''
+            Reads the ontology file (lines like UMLS|aapp-affects-biof)
+
+            :params
+                cache_path: pickled index, rebuilt when the ontology file changes (optional)
+        '''
+        source = os.stat(path)
+        key = (INDEX_VERSION, source.st_size, source.st_mtime)
+
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                cached_key, index = pickle.load(f)
+            if cached_key == key:
+                return index
+
+        triples = []
+        with open(path, 'r') as f:
+            for line in f:
+                fields = line.strip().split('|')
+                if len(fields) < 2:
+                    continue
+                triple = fields[1].split('-')
+                if len(triple) == 3:
+                    triples.append(triple)
+        index = cls(triples)
+
+        if cache_path is not None:
+            with open(cache_path, 'wb') as f:
+                pickle.dump((key, index), f, protocol = pickle.HIGHEST_PROTOCOL)
+        return index
+
+    def allows(self, subject, predicate, object):
+        objects = self.objects.get((subject, predicate))
+        return objects is not None and object in objects
+
+    def get_predicates(self, subject, object):
+        return self.predicates.get((subject, object), frozenset())
+
+    def encode_semtypes(self, semtypes):
+        unknown = len(self.semtype_codes)
+        return np.array([self.semtype_codes.get(semtype, unknown) for semtype in semtypes], dtype = np.intp)
+
+    def encode_predicates(self, predicates):
+        unknown = len(self.predicate_codes)
+        return np.array([self.predicate_codes.get(predicate, unknown) for predicate in predicates], dtype = np.intp)
+
+    def allowed_pairs(self, subjects, predicates, objects):
+        '''
+            :params
+                subjects, objects: semtype codes of the pairs (see encode_semtypes)
+                predicates: predicate codes (see encode_predicates)
+            :returns
+                (pairs x predicates) boolean array, is subject-predicate-object allowed
+        '''
+        return self.allowed[subjects[:, None], predicates[None, :], objects[:, None]]
+
+    def __len__(self):
+        return sum(len(objects) for objects in self.objects.values())
@@ -1,51 +1,180 @@
-
+from concurrent.futures import Future
 from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer
+from socketserver import ThreadingMixIn
 import optparse
 import os.path
 import pexpect
+import queue
+import threading
 import time
 
+# a record set either ends with the closing tag or is an empty element when nothing matched
+LEXRECORDS_END = r'</lexRecords>|<lexRecords\s*/>'
+
 class LexAccess():
-    def __init__(self, path):
+    def __init__(self, path, timeout = 10):
+        self.path = path
+        self.timeout = timeout
+        self.restarts = 0
+        self.answered = 0
+        # batches answered in a LexAccessCluster
+        self.batches = 0
+
+        self.start()
+
+    def start(self):
         # spawn the server
-        self.process = pexpect.spawn(path, encoding='utf-8')
-        self.process.readline()
-        self.process.readline()
-        # self.process.setecho(False)
+        self.process = pexpect.spawn(self.path, encoding='utf-8', timeout = self.timeout)
+        self.process.setecho(False)
+        # pexpect sleeps before every send by default
+        self.process.delaybeforesend = None
         # self.process.expect('done')
         # self.process.expect('\r\n')
 
+    def restart(self):
+        if self.process.isalive():
+            self.process.terminate(force = True)
+        self.restarts += 1
+        self.start()
+
+    def is_alive(self):
+        return self.process.isalive()
+
     def parse(self, text):
+        try:
+            results = self.send(text)
+        except pexpect.EOF:
+            # the JVM may have exited before this text was sent, it is sent once more
+            print("Restarting LexAccess (%s)" % text)
+            self.restart()
+            results = self.send(text)
+        except pexpect.TIMEOUT:
+            # a text that hangs the JVM is not sent again, a hung child only fails this text
+            print("LexAccess not responding, restarting (%s)" % text)
+            self.restart()
+            raise
+        self.answered += 1
+        return results
+
+    def send(self, text):
         # Clear any pending output
         try:
-            self.process.read_nonblocking(2048, 0)
-        except:
+            while True:
+                self.process.read_nonblocking(2048, 0)
+        except (pexpect.TIMEOUT, pexpect.EOF):
             pass
 
         self.process.sendline(text)
-        self.process.readline()
-        #self.process.expect(u'</lexRecords>')
-        self.process.expect('</lexRecords>')
+        self.process.expect(LEXRECORDS_END)
         # self.process.expect(u'----------')
-        
-
-        # Workaround pexpect bug
-        # self.process.waitnoecho()
 
         # Long text also needs increase in socket timeout
         # timeout = 5 + len(text) / 20.0
 
-        # self.process.expect(u'----------', timeout)
         results = self.process.before + self.process.after
-        
-        self.process.readline()
 
-        return results
+        # drop anything printed before the records (e.g. the xml declaration)
+        return results[results.rfind('<lexRecords'):]
+
+    def parse_many(self, texts):
+        return [self.parse(text) for text in texts]
+
+class LexAccessCluster():
+    '''
+        Runs several LexAccess children and answers requests concurrently.
+
+        Requests go to a shared queue. Each child has a dispatcher thread that takes
+        the next request, waits up to batch_window seconds for more to arrive (up to
+        batch_size in total) and answers the whole batch before it returns to the
+        queue. The texts of parse_many are queued as one part per child, and a part
+        taken first is answered as it is, so that the parts are spread over the
+        children. A child that times out is restarted without stalling the others.
+    '''
+    def __init__(self, path, workers = 4, timeout = 10, batch_size = 32, batch_window = 0.005):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.requests = queue.Queue()
+
+        self.children = []
+        for i in range(workers):
+            child = LexAccess(path, timeout)
+            self.children.append(child)
+
+            thread = threading.Thread(target = self.dispatch, args = (child,), daemon = True)
+            thread.start()
+
+    def dispatch(self, child):
+        while True:
+            # a list of (text, future)
+            batch = self.requests.get()
+
+            # a part of parse_many is answered as it is
+            if len(batch) == 1:
+                deadline = time.time() + self.batch_window
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        requests = self.requests.get(timeout = remaining)
+                    except queue.Empty:
+                        break
+                    # the rest of a part that does not fit goes back to the queue
+                    room = self.batch_size - len(batch)
+                    if len(requests) > room:
+                        self.requests.put(requests[room:])
+                    batch.extend(requests[:room])
+
+            if not child.is_alive():
+                child.restart()
+            child.batches += 1
+
+            for text, future in batch:
+                try:
+                    future.set_result(child.parse(text))
+                except Exception as e:
+                    future.set_exception(e)
+
+    def submit(self, texts):
+        '''
+            Queues texts to be answered by one child
+        '''
+        futures = [Future() for text in texts]
+        self.requests.put(list(zip(texts, futures)))
+        return futures
+
+    def parse(self, text):
+        return self.submit([text])[0].result()
+
+    def parse_many(self, texts):
+        # one part per child (at most batch_size texts), so that all children work on the batch
+        size = min(self.batch_size, max(1, -(-len(texts) // len(self.children))))
+        futures = []
+        for start in range(0, len(texts), size):
+            futures.extend(self.submit(texts[start:start + size]))
+        return [future.result() for future in futures]
+
+    def health(self):
+        return {'pending': self.requests.qsize(),
+                'children': [{'alive': child.is_alive(), 'restarts': child.restarts,
+                              'answered': child.answered, 'batches': child.batches}
+                             for child in self.children]}
+
+class ThreadedJSONRPCServer(ThreadingMixIn, SimpleJSONRPCServer):
+    daemon_threads = True
 
 def main():
     parser = optparse.OptionParser(usage="%prog [OPTIONS]")
     parser.add_option('-p', '--port', type="int", default=8085,
                       help="Port to bind to [8083]")
+    parser.add_option('-w', '--workers', type="int", default=4,
+                      help="Number of LexAccess processes [4]")
+    parser.add_option('-t', '--timeout', type="float", default=10,
+                      help="Seconds before a LexAccess process is restarted [10]")
+    parser.add_option('--batch-size', type="int", default=32,
+                      help="Maximum number of requests handled by a process at once [32]")
+    parser.add_option('--batch-window', type="float", default=0.005,
+                      help="Seconds to wait for requests to add to a batch [0.005]")
     # parser.add_option('--path', default=DIRECTORY,
     #                   help="Path to OpenNLP install [%s]" % DIRECTORY)
 
@@ -58,14 +187,16 @@ def main():
     addr = ('localhost', options.port)
     uri = 'http://%s:%s' % addr
 
-    server = SimpleJSONRPCServer(addr)
+    server = ThreadedJSONRPCServer(addr)
 
-    print("Starting LexAccess")
-    nlp = LexAccess(path)
+    print("Starting %d LexAccess processes" % options.workers)
+    nlp = LexAccessCluster(path, options.workers, options.timeout, options.batch_size, options.batch_window)
     server.register_function(nlp.parse)
+    server.register_function(nlp.parse_many)
+    server.register_function(nlp.health)
 
     print("Serving on %s" % uri)
     server.serve_forever()
-	
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,211 @@
+'''
+Local stand-in for the MetaMapLite, GNormPlus, WSD and hierarchy servers.
+
+Replays responses recorded in a fixture file (one JSON object per line:
+{"service": ..., "request": ..., "response": ...}) on the ports of the [SERVERS]
+config. In record mode, requests are forwarded to the real servers and the
+exchanges are appended to the fixture file.
+
+    # record while running the pipeline against the real servers
+    python replayserver.py --config ../default.config --fixtures fixtures.jsonl --record
+    # replay with 50 +/- 20 ms of latency per request
+    python replayserver.py --config ../default.config --fixtures fixtures.jsonl --latency 0.05 --jitter 0.02
+
+Point the pipeline at the stand-in with host = localhost in [SERVERS].
+'''
+from socketclient import SocketClient
+import configparser
+import json
+import optparse
+import random
+import select
+import socketserver
+import struct
+import threading
+import time
+
+SERVICES = ['metamaplite', 'gnormplus', 'wsd', 'hierarchy']
+
+# services whose clients read a single response without waiting for the connection to close
+RECEIVE_ONCE = ['gnormplus', 'hierarchy']
+
+# seconds to wait for more lines of a legacy request (e.g. a hierarchy batch), a request
+# is sent at once so its lines follow each other without delay
+REQUEST_WAIT = 0.01
+
+class Fixtures:
+    '''
+        Recorded responses, by (service, request)
+    '''
+    def __init__(self, path = None):
+        self.path = path
+        self.responses = {}
+        self.lock = threading.Lock()
+        self.misses = 0
+
+        if path is not None:
+            try:
+                with open(path, 'r') as f:
+                    for line in f:
+                        if line.strip() != '':
+                            exchange = json.loads(line)
+                            self.responses[(exchange['service'], exchange['request'])] = exchange['response']
+            except FileNotFoundError:
+                pass
+
+    def get(self, service, request):
+        response = self.responses.get((service, request))
+        if response is None:
+            with self.lock:
+                self.misses += 1
+            print(f'No recorded response ({service}): {request[:80]}')
+        return response
+
+    def record(self, service, request, response):
+        with self.lock:
+            self.responses[(service, request)] = response
+            if self.path is not None:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'service' : service, 'request' : request, 'response' : response}) + '\n')
+
+class ReplayHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        if server.framing is None:
+            # legacy protocol: one request (one or more lines), one response, then the connection is closed
+            request = self.receive_request()
+            if request:
+                self.wfile.write(server.respond(request.decode('UTF-8')).encode('UTF-8'))
+            return
+
+        # keep-alive protocols of SocketClient (see SocketClient.request)
+        while True:
+            if server.framing == 'length':
+                header = self.rfile.read(4)
+                if len(header) < 4:
+                    return
+                request = self.rfile.read(struct.unpack('>I', header)[0])
+                response = server.respond(request.decode('UTF-8')).encode('UTF-8')
+                self.wfile.write(struct.pack('>I', len(response)) + response)
+            else:
+                request = self.rfile.readline()
+                if not request:
+                    return
+                self.wfile.write(server.respond(request.decode('UTF-8')).encode('UTF-8') + server.terminator)
+            self.wfile.flush()
+
+    def receive_request(self):
+        # the request ends with a line break that is not followed by more data
+        # (read from the socket, the buffered rfile could hold lines of it)
+        request = b''
+        while True:
+            bytes_received = self.request.recv(65536)
+            if not bytes_received:
+                break
+            request += bytes_received
+            if request.endswith(b'\n') and not select.select([self.request], [], [], REQUEST_WAIT)[0]:
+                break
+        return request
+
+class ReplayServer(socketserver.ThreadingTCPServer):
+    '''
+        Answers the requests of one service from the fixtures
+
+        :params
+            upstream: (host, port) of the real server, requests are recorded if given
+            latency, jitter: seconds added to every response (latency +/- jitter)
+            framing, terminator: as in SocketClient (None: legacy protocol)
+    '''
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, service, fixtures, host = 'localhost', port = 0, upstream = None,
+                 latency = 0, jitter = 0, framing = None, terminator = '\n\n'):
+        self.service = service
+        self.fixtures = fixtures
+        self.upstream = upstream
+        self.latency = latency
+        self.jitter = jitter
+        self.framing = framing
+        self.terminator = terminator.encode('UTF-8')
+        self.requests = 0
+
+        super().__init__((host, port), ReplayHandler)
+        self.port = self.server_address[1]
+
+    def respond(self, request):
+        self.requests += 1
+        request = request.rstrip('\n')
+
+        if self.upstream is not None:
+            client = SocketClient(self.upstream[0], self.upstream[1])
+            response = client.send(request, self.service in RECEIVE_ONCE)
+            self.fixtures.record(self.service, request, response)
+        else:
+            response = self.fixtures.get(self.service, request)
+            if response is None:
+                response = ''
+
+            delay = self.latency + random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+
+        return response
+
+    def start(self):
+        '''
+            Serves from a background thread (e.g. for tests and benchmarks)
+        '''
+        thread = threading.Thread(target = self.serve_forever, daemon = True)
+        thread.start()
+        return self
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [OPTIONS]")
+    parser.add_option('--config', default='../default.config',
+                      help="Config file with the [SERVERS] ports [../default.config]")
+    parser.add_option('--fixtures', default='fixtures.jsonl',
+                      help="Fixture file [fixtures.jsonl]")
+    parser.add_option('--host', default='localhost',
+                      help="Host to bind to [localhost]")
+    parser.add_option('--record', action='store_true', default=False,
+                      help="Forward requests to the real servers and record the responses")
+    parser.add_option('--upstream-host', default=None,
+                      help="Host of the real servers [host of the config]")
+    parser.add_option('--latency', type="float", default=0,
+                      help="Seconds added to every replayed response [0]")
+    parser.add_option('--jitter', type="float", default=0,
+                      help="Random variation of the latency in seconds [0]")
+    parser.add_option('--framing', default=None,
+                      help="length or terminator for keep-alive clients [legacy protocol]")
+    options, args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(options.config)
+    servers = config['SERVERS']
+
+    fixtures = Fixtures(options.fixtures)
+    print("Loaded %d recorded responses" % len(fixtures.responses))
+
+    replay_servers = []
+    for service in SERVICES:
+        port = servers.get(service + '_port')
+        if port is None:
+            continue
+
+        upstream = (options.upstream_host or servers['host'], int(port)) if options.record else None
+        replay_server = ReplayServer(service, fixtures, options.host, int(port), upstream,
+                                     options.latency, options.jitter, options.framing)
+        replay_servers.append(replay_server.start())
+        print("Serving %s on %s:%s" % (service, options.host, port))
+
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        for replay_server in replay_servers:
+            replay_server.shutdown()
+        print("%d requests without a recorded response" % fixtures.misses)
+
+if __name__ == '__main__':
+    main()
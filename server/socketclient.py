@@ -1,60 +1,174 @@
-import subprocess
 import socket
+import struct
+import threading
+import time
+
+class ConnectionPool:
+    '''
+        Idle keep-alive connections, per (host, port)
+    '''
+    def __init__(self, max_idle = 8):
+        self.max_idle = max_idle
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, host, port, connect_timeout):
+        with self.lock:
+            idle = self.connections.get((host, str(port)))
+            if idle:
+                return idle.pop()
+        return socket.create_connection((host, port), timeout = connect_timeout)
+
+    def release(self, host, port, sock):
+        with self.lock:
+            idle = self.connections.setdefault((host, str(port)), [])
+            if len(idle) < self.max_idle:
+                idle.append(sock)
+                return
+        sock.close()
+
+    def close_all(self):
+        with self.lock:
+            for idle in self.connections.values():
+                for sock in idle:
+                    sock.close()
+            self.connections = {}
+
+# shared by all clients of the process
+connection_pool = ConnectionPool()
+
+CLIENT_OPTIONS = {'timeout' : float, 'connect_timeout' : float, 'retries' : int, 'backoff' : float,
+                  'idle_timeout' : float, 'framing' : str, 'terminator' : str}
+
+def get_client_options(servers, name):
+    '''
+        SocketClient settings of a service from the [SERVERS] config
+
+        A setting can be given for one service (e.g. metamaplite_framing = length)
+        or for all of them (e.g. retries = 5).
+    '''
+    options = {}
+    for option, cast in CLIENT_OPTIONS.items():
+        value = servers.get(f'{name}_{option}', servers.get(option))
+        if value is not None:
+            options[option] = cast(value)
+    return options
 
 class SocketClient:
-    def __init__(self, host, port, timeout = 5, buffer_size = 4096, retries = 3):
+    def __init__(self, host, port, timeout = None, buffer_size = 4096, retries = 3,
+                 connect_timeout = None, framing = None, terminator = '\n\n', backoff = 0.1,
+                 idle_timeout = 0.5):
+        '''
+            :params
+                timeout: read timeout in seconds (None: reads block until the server answers)
+                connect_timeout: connection timeout in seconds (defaults to timeout)
+                retries: number of attempts before giving up
+                backoff: seconds to wait after the first failed attempt, doubled after each one
+                idle_timeout: with receive_once, seconds without data after which the response is complete
+                framing: how the end of a response is found
+                    None: the response ends when the server closes the connection
+                    length: request and response are prefixed with their length (4 bytes, big endian)
+                    terminator: the response ends with terminator (by default a blank line,
+                                it must not occur inside a response)
+                    Connections are kept open and reused with length or terminator framing.
+        '''
         self.timeout = timeout
+        self.connect_timeout = connect_timeout if connect_timeout is not None else timeout
         self.buffer_size = buffer_size
         self.retries = retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+
+        self.framing = framing
+        self.terminator = terminator.encode('UTF-8')
 
         self.host = host
         self.port = port
 
     def send(self, text, receive_once = False):
-        # try:
-            # add a line break -- important for connecting to Java servers
-            if text[-1] != '\n':
-                text += '\n'
+        '''
+            Sends text to the server and returns its response
 
-            # create connection and send data to server
-            sock = socket.create_connection((self.host, self.port))
-            sock.sendall(text.encode('UTF-8'))
+            Without framing, the response ends at end of stream. receive_once is for the
+            servers of the legacy protocol that keep the connection open after answering
+            (GNormPlus, hierarchy): the response also ends when nothing has been received
+            for idle_timeout seconds after its first bytes.
+        '''
+        # add a line break -- important for connecting to Java servers
+        if text[-1] != '\n':
+            text += '\n'
+        request = text.encode('UTF-8')
 
-            # receive data (broken down in to buffer_size chunks)
-            response = ''
-            while True:
-                bytes_received = sock.recv(self.buffer_size)
+        for attempt in range(self.retries):
+            try:
+                return self.request(request, receive_once).strip()
+            except (OSError, EOFError):
+                if attempt + 1 == self.retries:
+                    print(f'Error connecting to server: {self.host}:{self.port}')
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def request(self, request, receive_once):
+        if self.framing is None:
+            # create connection and send data to server
+            sock = socket.create_connection((self.host, self.port), timeout = self.connect_timeout)
+            try:
+                sock.settimeout(self.timeout)
+                sock.sendall(request)
+                return self.receive(sock, receive_once).decode('UTF-8')
+            finally:
+                sock.close()
 
-                # stop listening when no more bytes are received
-                # if not bytes_received or bytes_received.decode().strip() == '':
-                #     break
+        sock = connection_pool.acquire(self.host, self.port, self.connect_timeout)
+        try:
+            sock.settimeout(self.timeout)
+            if self.framing == 'length':
+                sock.sendall(struct.pack('>I', len(request)) + request)
+                response = self.receive_exactly(sock, struct.unpack('>I', self.receive_exactly(sock, 4))[0])
+            else:
+                sock.sendall(request)
+                response = self.receive_until(sock, self.terminator)
+        except BaseException:
+            # the connection is in an unknown state, do not reuse it
+            sock.close()
+            raise
 
-                # convert received bytes into string and merge with current response
-                response += bytes_received.decode()
+        connection_pool.release(self.host, self.port, sock)
+        return response.decode('UTF-8')
 
-                # stop listening when no more bytes are received
-                # print(len(bytes_received))
-                if not bytes_received or receive_once:
+    def receive(self, sock, receive_once = False):
+        # receive data (broken down in to buffer_size chunks) until the server closes the connection
+        # bytes are decoded at the end, a multi-byte character may span two chunks
+        response = bytearray()
+        while True:
+            try:
+                bytes_received = sock.recv(self.buffer_size)
+            except socket.timeout:
+                # the server is quiet after answering
+                if receive_once and len(response) > 0:
                     break
+                raise
+            if not bytes_received:
+                break
+            if receive_once and len(response) == 0:
+                sock.settimeout(self.idle_timeout)
+            response += bytes_received
+        return bytes(response)
 
-            sock.close()
+    def receive_exactly(self, sock, length):
+        response = bytearray()
+        while len(response) < length:
+            bytes_received = sock.recv(min(self.buffer_size, length - len(response)))
+            if not bytes_received:
+                raise EOFError('Connection closed before the end of the response')
+            response += bytes_received
+        return bytes(response)
 
-            # check output
-            # print(f'echo "{text.strip()}" | nc {self.host} {self.port}')
-            # ps = subprocess.Popen(f'echo "{text.strip()}" | nc {self.host} {self.port}', shell=True,
-            #                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            # output = ps.communicate()[0]
-            # if output.decode().strip() != response.strip():
-            #     print('-------')
-            #     print(output.decode())
-            #     print('-------')
-            #     print(len(response.encode()))
-            #     print(len(response.strip()))
-            #     input('ERROR')
-
-            return response.strip()
-        # what to do if exception is received??
-        # except Exception as e:
-        #     print(f'Error connecting to server: {self.host}:{self.port}')
-        #     print(e)
-        #     return ''
\ No newline at end of file
+    def receive_until(self, sock, terminator):
+        response = bytearray()
+        while not response.endswith(terminator):
+            bytes_received = sock.recv(self.buffer_size)
+            if not bytes_received:
+                raise EOFError('Connection closed before the end of the response')
+            response += bytes_received
+        return bytes(response[:-len(terminator)])
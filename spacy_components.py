@@ -1,15 +1,29 @@
 from spacy.language import Language
 from spacy.tokens import Doc
 from spacy.tokens import Token
+from spacy.util import minibatch
 from lexaccess import LexAccess
-from multiprocessing import Pool
+from lexindex import LexIndex
+from concurrent.futures import ThreadPoolExecutor
 from string import punctuation
+from typing import Optional
 import re
 import json
+import numpy as np
 
 from opennlpcl import *
+from tagchunker import chunk_tags
+from socketclient import get_client_options
+from cache import CachedAnnotator, LookupCache
+from concepts import SEMGROUPS, SEMTYPES
+from hierarchy import HierarchyClient
+from hierarchyindex import HierarchyIndex
+from predicateindex import PredicateIndex
+from spans import fuse_spans, TokenOffsetIndex
 from gnormplus import *
 from metamaplite import *
+from dictionarymatcher import DictionaryConceptMatcher
+from indicatorindex import IndicatorIndex
 from wsd import *
 
 PREDICATIVE_CATEGORIES = set(['NN', 'VB', 'JJ', 'RB', 'PR'])
@@ -22,6 +36,10 @@ APPOSITIVE_INDICATORS = ['such as', 'particularly', 'in particular', 'including'
 NON_HYPERNYM_CUIS = ['C1457887'] # Symptom
 GEOA_HYPERNYMS = ['country', 'countries', 'islands', 'continent', 'locations', 'city', 'cities']
 
+# semantic groups that do not give a hypernym relation on their own
+NON_HYPERNYM_SEMGROUPS = SEMGROUPS.mask(['anat', 'conc'])
+GEOA_SEMTYPES = SEMTYPES.mask(['geoa'])
+
 MODHEAD_TYPES = ['process_of', 'inverse:uses', 'location_of', 'inverse:part_of', 'inverse:process_of']
 
 def get_pos_category(tag):
@@ -142,6 +160,17 @@ class Concept:
         self.span = span
         self.annotation = annotation
 
+class IndicatorMatch:
+    def __init__(self, spans, srindicator):
+        '''
+            :params
+                spans: the tokens of the indicator, two spans for gapped indicators
+        '''
+        self.spans = spans
+        self.span = spans[0].doc[spans[0].start:spans[-1].end]
+        self.srindicator = srindicator
+        self.seminfo = srindicator.seminfo
+
 class Relation:
     def __init__(self, subject, predicate, object):
         self.subject = subject
@@ -151,17 +180,51 @@ class Relation:
 '''
 This is a pipeline component that looks up tokens in the lexicon.
 
-We specifically use LexAccess for lexicon matching.
+We specifically use LexAccess for lexicon matching, or an offline index of the
+lexicon (mode = index, see lexindex.py).
 '''
-@Language.factory('lexmatcher', default_config = {'path' : None})
-def create_lexmatcher_component(nlp: Language, name: str, path: str):
+@Language.factory('lexmatcher', default_config = {'path' : None, 'mode' : 'subprocess', 'workers' : 1,
+                                                  'index_path' : None, 'cache_size' : 100000, 'cache_path' : None,
+                                                  'max_ngram' : 0, 'infl_vars' : False, 'version' : ''})
+def create_lexmatcher_component(nlp: Language, name: str, path: Optional[str], mode: str, workers: int,
+                                index_path: Optional[str], cache_size: int, cache_path: Optional[str],
+                                max_ngram: int, infl_vars: bool, version: str):
     Doc.set_extension('lexmatches', default = [])
 
-    return LexMatcherComponent(nlp, path)
+    return LexMatcherComponent(nlp, path, mode, workers, index_path, cache_size, cache_path, max_ngram, infl_vars,
+                               version)
 
 class LexMatcherComponent:
-    def __init__(self, nlp: Language, path: str):
-        self.lexmatcher = LexAccess(path)
+    def __init__(self, nlp: Language, path: str, mode: str = 'subprocess', workers: int = 1,
+                 index_path: Optional[str] = None, cache_size: int = 100000, cache_path: Optional[str] = None,
+                 max_ngram: int = 0, infl_vars: bool = False, version: str = ''):
+        '''
+            max_ngram: if > 0, all candidate n-grams of a sentence up to this length are looked up
+                       in one batch before matching; otherwise every probe is a separate lookup.
+                       Only worth it when a batch is one round trip (subprocess or server mode),
+                       session mode still answers the terms of a batch one at a time
+            infl_vars: keep the inflection variants of the matched lexical records
+            version: version tag of the lexicon, part of the cache keys of the lookups
+        '''
+        if mode == 'index':
+            self.lexmatcher = LexIndex(index_path)
+        else:
+            self.lexmatcher = LexAccess(path, mode, workers, cache_size = cache_size, cache_path = cache_path,
+                                        infl_vars = infl_vars, version = version)
+        self.max_ngram = max_ngram
+
+    def is_lookup_token(self, token):
+        return token.text not in punctuation and token.text.strip() != ''
+
+    def get_candidates(self, sentence):
+        # every span that the matching loop below may probe, up to max_ngram tokens
+        candidates = []
+        for i in range(len(sentence)):
+            for j in range(i, min(i + self.max_ngram, len(sentence))):
+                if not self.is_lookup_token(sentence[j]):
+                    break
+                candidates.append(sentence[i:j + 1].text)
+        return candidates
 
     def add_match(self, doc:Doc , prev_lexrecords: list, prev_token_index: int, cur_token_index: int):
         text = doc[prev_token_index:cur_token_index]
@@ -179,19 +242,37 @@ class LexMatcherComponent:
 
         # find a match for each token, either by itself or as part of a phrase
         for sentence in doc.sents:
+            # the offline index finds all longest matches of the sentence at once
+            if isinstance(self.lexmatcher, LexIndex):
+                words = [token.text if self.is_lookup_token(token) else None for token in sentence]
+                for start, end, lexrecords in self.lexmatcher.longest_matches(words):
+                    self.add_match(doc, lexrecords, sentence.start + start, sentence.start + end)
+                continue
+
+            # resolve all candidates in one round trip and pick the longest matches locally;
+            # spans longer than max_ngram are not in the batch and are looked up one at a time
+            if self.max_ngram > 0:
+                batch_matches = self.lexmatcher.get_matches_batch(self.get_candidates(sentence))
+                def get_matches(text):
+                    if text in batch_matches:
+                        return batch_matches[text]
+                    return self.lexmatcher.get_matches(text)
+            else:
+                get_matches = self.lexmatcher.get_matches
+
             cur_token_index = sentence.start
             prev_token_index = sentence.start
             prev_lexrecords = None
 
             while cur_token_index < sentence.end:
-                if doc[cur_token_index].text not in punctuation and doc[cur_token_index].text.strip() != '':
+                if self.is_lookup_token(doc[cur_token_index]):
                     lookup_text = doc[prev_token_index:cur_token_index + 1].text
 
-                    lexrecords_xml = self.lexmatcher.get_matches(lookup_text)
+                    lexrecords = get_matches(lookup_text)
 
                     # if we find a record, try and match a longer string
-                    if lexrecords_xml is not None:
-                        prev_lexrecords = lexrecords_xml
+                    if lexrecords is not None:
+                        prev_lexrecords = lexrecords
                         cur_token_index += 1
                         continue
 
@@ -216,26 +297,68 @@ class LexMatcherComponent:
             if prev_lexrecords is not None:
                 self.add_match(doc, prev_lexrecords, prev_token_index, cur_token_index)
 
+        if self.lexmatcher.cache is not None:
+            print(f'LexAccess cache: {self.lexmatcher.cache.stats()}')
         print('-----End: lexicon matching-----')
 
         return doc
 
+def annotation_name(ontology):
+    # key of the annotations of an ontology in Concept.annotation
+    return getattr(ontology, 'annotation_name', ontology.__name__)
+
+def annotate_each(annotator, texts):
+    return [annotator.annotate(text) for text in texts]
+
+'''
+This is a pipeline component that finds the SemRep indicators (e.g. inhibit,
+due to, increase ... risk) of each sentence, with the index of indicatorindex.py.
+'''
+@Language.factory('srindicator', default_config = {'semrules_cache' : None})
+def create_srindicator_component(nlp: Language, name: str, semrules: str, semrules_cache: Optional[str]):
+    Doc.set_extension('indicators', default = [])
+
+    return IndicatorComponent(nlp, semrules, semrules_cache)
+
+class IndicatorComponent:
+    def __init__(self, nlp: Language, semrules: str, semrules_cache: str = None):
+        '''
+            :params
+                semrules_cache: file where the indicator index is kept between runs (optional)
+        '''
+        self.indicator_index = IndicatorIndex.load(semrules, semrules_cache)
+
+    def __call__(self, doc: Doc) -> Doc:
+        doc._.indicators = []
+        for sent in doc.sents:
+            matches = self.indicator_index.match([token.lemma_ for token in sent],
+                                                 [token.lower_ for token in sent],
+                                                 [token.tag_ for token in sent])
+            for parts, srindicator in matches:
+                spans = [doc[sent.start + start:sent.start + end] for start, end in parts]
+                doc._.indicators.append(IndicatorMatch(spans, srindicator))
+                print(f'Indicator: {" ... ".join(span.text for span in spans)} {[seminfo.category for seminfo in srindicator.seminfo]}')
+
+        return doc
+
 '''
 This is a pipeline component that replaces the NER tagging.
 
-For now, it uses GNormPlus and MetaMapLite.
+For now, it uses GNormPlus and MetaMapLite, or a local DictionaryConceptMatcher
+built from concept_table in place of MetaMapLite.
 '''
-@Language.factory('concept_match', default_config = {'ontologies' : str, 'server_paths' : dict})
-def create_concept_match_component(nlp: Language, name: str, ontologies: str, server_paths: dict):
+@Language.factory('concept_match', default_config = {'ontologies' : str, 'server_paths' : dict, 'concept_table' : None})
+def create_concept_match_component(nlp: Language, name: str, ontologies: str, server_paths: dict,
+                                   concept_table: Optional[str]):
     ## add properties used by SemRep
     Doc.set_extension('concepts', default = [])
     Token.set_extension('concept_index', default = None)
 
-    return ConceptMatchComponent(nlp, ontologies, server_paths)
+    return ConceptMatchComponent(nlp, ontologies, server_paths, concept_table)
 
 # TO DO: create objects for annotations??
 class ConceptMatchComponent:
-    def __init__(self, nlp: Language, ontologies: str, server_paths: dict):
+    def __init__(self, nlp: Language, ontologies: str, server_paths: dict, concept_table: str = None):
         self.ontologies = []
         self.servers = server_paths
 
@@ -243,102 +366,130 @@ class ConceptMatchComponent:
             ontology = ontology.strip()
             self.ontologies.append(globals()[ontology])
 
-    def get_span_from_char_indices(self, doc, char_start_index, char_end_index):
-        token_start_index = None
-        for token in doc:
-            if token_start_index is None:
-                if char_start_index > token.idx:
-                    continue
-                if char_start_index == token.idx:
-                    token_start_index = token.i
-                if char_start_index < token.idx:
-                    token_start_index = token.i - 1
-            else:
-                if token.idx > char_end_index:
-                    print(f'cc: {token}')
-                    print(f'char: {doc[token_start_index: token.i]}')
-                    return token_start_index, token.i
-        if token_start_index is None:
-            print('Error: out of boundary character indices')
-
-        return token_start_index, len(doc)
-
-    def get_concept_token_span(self, doc, char_start_index, char_end_index):
-        token_start_index = None
-        for token in doc:
-            token_char_indices = range(token.idx, token.idx + len(token) + 1)
-            if char_start_index in token_char_indices:
-                token_start_index = token.i
-            if char_end_index in token_char_indices:
-                return token_start_index, token.i + 1
+        # parsed annotations are cached by ontology, server version and text
+        # (concept_cache_size = 0 without concept_cache_path disables caching)
+        ttl = self.servers.get('concept_cache_ttl')
+        max_disk_entries = self.servers.get('concept_cache_max_entries')
+        self.cache = LookupCache(int(self.servers.get('concept_cache_size', 10000)),
+                                 self.servers.get('concept_cache_path'),
+                                 float(ttl) if ttl is not None else None,
+                                 int(max_disk_entries) if max_disk_entries is not None else None)
+        use_cache = self.cache.maxsize > 0 or self.cache.path is not None
+
+        # the annotators only wait on their servers, so threads are enough to query them in parallel
+        self.annotators = {}
+        for ontology in self.ontologies:
+            # local annotators (e.g. DictionaryConceptMatcher) do not need a server or a cache
+            if getattr(ontology, 'local', False):
+                self.annotators[annotation_name(ontology)] = ontology(concept_table)
+                continue
+
+            options = get_client_options(self.servers, ontology.__name__.lower())
+            # size of the batch requests of annotators that support them (see MetamapLite.annotate_batch)
+            if ontology.__name__.lower() + '_batch_bytes' in self.servers:
+                options['batch_bytes'] = int(self.servers[ontology.__name__.lower() + '_batch_bytes'])
+            annotator = ontology(self.servers['host'], self.servers[ontology.__name__.lower() + '_port'], **options)
+            if use_cache:
+                annotator = CachedAnnotator(annotator, ontology.__name__,
+                                            self.servers.get(ontology.__name__.lower() + '_version', ''), self.cache)
+            self.annotators[annotation_name(ontology)] = annotator
+        self.executor = ThreadPoolExecutor(max_workers = len(self.ontologies))
 
     def __call__(self, doc: Doc) -> Doc:
         print('-----Start: concept matching-----')
 
-        processes = {}
-        with Pool(processes = len(self.ontologies)) as pool:
-            for ontology in self.ontologies:
-                processes[ontology.__name__] = pool.apply_async(ontology(self.servers['host'],
-                        self.servers[ontology.__name__.lower() + '_port']).annotate, args=(doc.text,))
+        futures = {}
+        for ontology in self.ontologies:
+            futures[annotation_name(ontology)] = self.executor.submit(self.annotators[annotation_name(ontology)].annotate, doc.text)
 
-            annotations = {}
-            for ontology in self.ontologies:
-                annotations[ontology.__name__] = processes[ontology.__name__].get()
+        annotations = {}
+        for ontology in self.ontologies:
+            annotations[annotation_name(ontology)] = futures[annotation_name(ontology)].result()
 
         # wsd -> THIS DOES NOT WORK AGAIN -- NEED TO RECHECK
         # WSD(servers['host'], servers[ontology.__name__.lower() + '_port']).disambiguate(annotations['MetamapLite'], text)
 
-        span_lengths = {}
+        self.set_concepts(doc, annotations)
+
+        print(f'concept cache: {self.cache.stats()}')
+        print('-----End: lexicon matching-----')
+
+        return doc
+
+    def pipe(self, stream, batch_size = 128):
+        '''
+            Annotates batch_size docs at a time, with a single batch call for the
+            annotators that support it (e.g. MetamapLite.annotate_batch)
+        '''
+        for docs in minibatch(stream, size = batch_size):
+            print(f'-----Start: concept matching ({len(docs)} docs)-----')
+
+            texts = [doc.text for doc in docs]
+            futures = {}
+            for ontology in self.ontologies:
+                annotator = self.annotators[annotation_name(ontology)]
+                if hasattr(annotator, 'annotate_batch'):
+                    futures[annotation_name(ontology)] = self.executor.submit(annotator.annotate_batch, texts)
+                else:
+                    futures[annotation_name(ontology)] = self.executor.submit(annotate_each, annotator, texts)
+
+            batch_annotations = {}
+            for ontology in self.ontologies:
+                batch_annotations[annotation_name(ontology)] = futures[annotation_name(ontology)].result()
+
+            for i, doc in enumerate(docs):
+                self.set_concepts(doc, {name : annotations[i] for name, annotations in batch_annotations.items()})
+                yield doc
+
+            print(f'concept cache: {self.cache.stats()}')
+            print('-----End: concept matching-----')
+
+    def set_concepts(self, doc, annotations):
+        '''
+            :params
+                annotations: {ontology name : {(start, length) : concepts}}
+        '''
+        span_concepts = {}
         for ontology in self.ontologies:
-            for (start, length), concept in annotations[ontology.__name__].items():
-                if length not in span_lengths:
-                    span_lengths[length] = {}
-                if (start, start + length) not in span_lengths[length]:
-                    span_lengths[length][(start, start + length)] = {}
-                span_lengths[length][(start, start + length)][ontology.__name__] = concept
+            for (start, length), concept in annotations[annotation_name(ontology)].items():
+                if (start, start + length) not in span_concepts:
+                    span_concepts[(start, start + length)] = {}
+                span_concepts[(start, start + length)][annotation_name(ontology)] = concept
 
-        sorted_span_lengths = list(span_lengths.keys())
-        sorted_span_lengths.sort(reverse = True)
+        offset_index = TokenOffsetIndex.from_doc(doc)
 
-        merged_annotations = set()
         cur_concept_index = 0
-        for span_length in sorted_span_lengths:
-            for (start, end), concepts in span_lengths[span_length].items():
-                cur_span_range = set(range(start, end))
-
-                merge = True
-                for (merged_start, merged_end) in merged_annotations:
-                    merged_span_range = set(range(merged_start, merged_end))
-                    if len(cur_span_range.intersection(merged_span_range)) > 0:
-                        merge = False
-                        break
-                if merge:
-                    merged_annotations.add((start, end))
-                    token_start_index, token_end_index = self.get_concept_token_span(doc, start, end)
-                    doc._.concepts.append(Concept(doc[token_start_index:token_end_index], concepts))
-
-                    for token in doc[token_start_index:token_end_index]:
-                        token._.concept_index = cur_concept_index
-                    cur_concept_index += 1
-
-                    print(f'concept: {doc[token_start_index:token_end_index]} |  matches: {concepts.keys()}')
+        for start, end in fuse_spans(span_concepts):
+            concepts = span_concepts[(start, end)]
 
-        print('-----End: lexicon matching-----')
+            token_span = offset_index.token_span(start, end)
+            if token_span is None:
+                print(f'Error: no token at character indices {start}-{end}')
+                continue
 
-        return doc
+            token_start_index, token_end_index = token_span
+            doc._.concepts.append(Concept(doc[token_start_index:token_end_index], concepts))
+
+            for token in doc[token_start_index:token_end_index]:
+                token._.concept_index = cur_concept_index
+            cur_concept_index += 1
+
+            print(f'concept: {doc[token_start_index:token_end_index]} |  matches: {concepts.keys()}')
 
 '''
 This is a pipeline component that separates the sentences into chunks (e.g. NP, VP).
 
-For now, it uses OpenNLP, but this can be configured to use another chunker.
+It uses OpenNLP (chunker = opennlp) or the spaCy tags (chunker = spacy).
 '''
-@Language.factory('chunker', default_config = {'chunker': 'opennlp', 'path' : None})
-def create_chunker_component(nlp: Language, name: str, chunker: str, path: str):
+@Language.factory('chunker', default_config = {'chunker': 'opennlp', 'path' : None, 'workers' : 1, 'batch_size' : 32})
+def create_chunker_component(nlp: Language, name: str, chunker: str, path: Optional[str], workers: int, batch_size: int):
     ## add properties used by SemRep
     Doc.set_extension('sentences', default = [])
 
     if chunker == 'opennlp':
-        return OpenNLPChunkerComponent(nlp, path)
+        return OpenNLPChunkerComponent(nlp, path, workers, batch_size)
+    if chunker == 'spacy':
+        return TagPatternChunkerComponent(nlp)
 
 '''
 For testing chunks: 
@@ -351,90 +502,141 @@ OBJECTIVE: To investigate the efficacy of intratympanic dexamethasone injections
 '''
 
 class OpenNLPChunkerComponent:
-    def __init__(self, nlp: Language, path: str):
-        self.chunker = OpenNLP(path)
+    def __init__(self, nlp: Language, path: str, workers: int = 1, batch_size: int = 32):
+        '''
+            :params
+                workers: number of OpenNLP processes
+                batch_size: number of sentences sent to a process at once
+        '''
+        self.chunker = OpenNLPPool(path, workers, batch_size)
+
+    def get_input(self, sent):
+        opennlp_input = ''
+        for token in sent:
+           opennlp_input += f'{token.text}_{token.tag_} '
+        return opennlp_input
 
     def __call__(self, doc: Doc) -> Doc:
-        current_token_index = 0
-        for sent in doc.sents:
-            opennlp_input = ''
-            for token in sent:
-               opennlp_input += f'{token.text}_{token.tag_} '
-            chunks = self.chunker.parse(opennlp_input).strip()
+        sents = list(doc.sents)
+        outputs = self.chunker.parse_many([self.get_input(sent) for sent in sents])
+        for sent, output in zip(sents, outputs):
+            self.add_sentence(doc, sent, output)
 
-            print(f'OpenNLP output: {chunks}')
-
-            sentence = Sentence()
+        return doc
 
-            for token in chunks.split():
-                if len(token) > 1 and token[0] == '[' and token[1] != '_':
-                    start_chunk_index = current_token_index
-                    chunk_type = token[1:]
-                    in_phrase_chunk = True
-                elif len(token) == 1 and token == ']':
-                    print(f'Chunk: {doc[start_chunk_index: current_token_index]}')
-                    sentence.add_chunk(Chunk(doc[start_chunk_index: current_token_index], chunk_type))
-                    in_phrase_chunk = False
-                elif len(token) == 1:
-                    input(f'Single token (not ]): {token}')
-                else:
-                    if not in_phrase_chunk:
-                        chunk_type = token.rsplit('_')[1]
-                        print(f'Chunk: {doc[current_token_index: current_token_index + 1]}')
-                        sentence.add_chunk(Chunk(doc[current_token_index: current_token_index + 1], chunk_type))
-                    current_token_index += 1
-            if start_chunk_index < current_token_index:
+    def pipe(self, stream, batch_size = 128):
+        '''
+            Chunks the sentences of batch_size docs together, spread over the OpenNLP processes
+        '''
+        for docs in minibatch(stream, size = batch_size):
+            sents = [(doc, sent) for doc in docs for sent in doc.sents]
+            outputs = self.chunker.parse_many([self.get_input(sent) for doc, sent in sents])
+            for (doc, sent), output in zip(sents, outputs):
+                self.add_sentence(doc, sent, output)
+
+            yield from docs
+
+    def add_sentence(self, doc, sent, output):
+        '''
+            Adds the chunks of an OpenNLP output (e.g. [NP Analgesic_JJ aspirin_NN] ._.) to doc._.sentences
+        '''
+        sentence = Sentence()
+        if output is False:
+            print(f'OpenNLP could not chunk: {sent}')
+            doc._.sentences.append(sentence)
+            return
+
+        chunks = output.strip()
+        print(f'OpenNLP output: {chunks}')
+
+        current_token_index = sent.start
+        start_chunk_index = sent.start
+        in_phrase_chunk = False
+        for token in chunks.split():
+            if len(token) > 1 and token[0] == '[' and token[1] != '_':
+                start_chunk_index = current_token_index
+                chunk_type = token[1:]
+                in_phrase_chunk = True
+            elif len(token) == 1 and token == ']':
                 print(f'Chunk: {doc[start_chunk_index: current_token_index]}')
                 sentence.add_chunk(Chunk(doc[start_chunk_index: current_token_index], chunk_type))
+                in_phrase_chunk = False
+            elif len(token) == 1:
+                input(f'Single token (not ]): {token}')
+            else:
+                if not in_phrase_chunk:
+                    chunk_type = token.rsplit('_')[1]
+                    print(f'Chunk: {doc[current_token_index: current_token_index + 1]}')
+                    sentence.add_chunk(Chunk(doc[current_token_index: current_token_index + 1], chunk_type))
+                current_token_index += 1
+        # close a chunk left open at the end of the sentence
+        if in_phrase_chunk and start_chunk_index < current_token_index:
+            print(f'Chunk: {doc[start_chunk_index: current_token_index]}')
+            sentence.add_chunk(Chunk(doc[start_chunk_index: current_token_index], chunk_type))
+
+        # OLD CHUNKING CODE
+
+        # This code does not work for this type of text, need to fix:
+        # Hypertension patients take[aspirin]].
+        # But for now, it works on most texts.
+
+        # # (?=(\[.*?\]))|(?=(\].*?\[)|(._\.)) --> old regex
+        # # current one fixes issues when text has brackets
+        # # use this for testing: [Vitamin D: synthesis, metabolism, regulation, and an assessment of its deficiency in patients with chronic renal disease].
+        # for chunk in re.findall(r'(?=(\[(?!_).*?\](?!_)))|(?=(\].*?\[)|([\.:]_[\.\:]))', chunks):
+        #     # if actual chunk, e.g. [NP Analgesic_JJ aspirin_NN]
+        #     if len(chunk[0]) > 0:
+        #         chunk = chunk[0].strip()[1:-1].split()
+        #
+        #         chunk_type = chunk[0]
+        #         chunk_tokens = chunk[1:]
+        #
+        #         end_index = cur_token_index + len(chunk_tokens)
+        #         sentence.add_chunk(Chunk(doc[cur_token_index: end_index], chunk_type))
+        #
+        #         print(f'Chunk: {sentence.chunks[-1].span}')
+        #
+        #         cur_token_index = end_index
+        #
+        #     # if space between chunks, i.e. ] [
+        #     # need example for this case
+        #     elif len(chunk[1]) > 0:
+        #         chunk = chunk[1][1:-1].strip()
+        #         if len(chunk) > 0:
+        #             for chunk in chunk.split():
+        #                 end_index = cur_token_index + 1
+        #
+        #                 sentence.add_chunk(Chunk(doc[cur_token_index: end_index], doc[cur_token_index: end_index].text))
+        #
+        #                 print(f'Chunk: {sentence.chunks[-1].span}')
+        #
+        #                 cur_token_index = end_index
+        #
+        #         # cur_token_index + len(chunk.split())
+        #
+        #     elif len(chunk[2]) > 0:
+        #         end_index = cur_token_index + 1
+        #         sentence.add_chunk(Chunk(doc[cur_token_index: end_index], doc[cur_token_index: end_index].text))
+        #
+        #         print(f'Chunk: {sentence.chunks[-1].span}')
+        #
+        #         cur_token_index = end_index
+
+        doc._.sentences.append(sentence)
 
-            # OLD CHUNKING CODE
-
-            # This code does not work for this type of text, need to fix:
-            # Hypertension patients take[aspirin]].
-            # But for now, it works on most texts.
-
-            # # (?=(\[.*?\]))|(?=(\].*?\[)|(._\.)) --> old regex
-            # # current one fixes issues when text has brackets
-            # # use this for testing: [Vitamin D: synthesis, metabolism, regulation, and an assessment of its deficiency in patients with chronic renal disease].
-            # for chunk in re.findall(r'(?=(\[(?!_).*?\](?!_)))|(?=(\].*?\[)|([\.:]_[\.\:]))', chunks):
-            #     # if actual chunk, e.g. [NP Analgesic_JJ aspirin_NN]
-            #     if len(chunk[0]) > 0:
-            #         chunk = chunk[0].strip()[1:-1].split()
-            #
-            #         chunk_type = chunk[0]
-            #         chunk_tokens = chunk[1:]
-            #
-            #         end_index = cur_token_index + len(chunk_tokens)
-            #         sentence.add_chunk(Chunk(doc[cur_token_index: end_index], chunk_type))
-            #
-            #         print(f'Chunk: {sentence.chunks[-1].span}')
-            #
-            #         cur_token_index = end_index
-            #
-            #     # if space between chunks, i.e. ] [
-            #     # need example for this case
-            #     elif len(chunk[1]) > 0:
-            #         chunk = chunk[1][1:-1].strip()
-            #         if len(chunk) > 0:
-            #             for chunk in chunk.split():
-            #                 end_index = cur_token_index + 1
-            #
-            #                 sentence.add_chunk(Chunk(doc[cur_token_index: end_index], doc[cur_token_index: end_index].text))
-            #
-            #                 print(f'Chunk: {sentence.chunks[-1].span}')
-            #
-            #                 cur_token_index = end_index
-            #
-            #         # cur_token_index + len(chunk.split())
-            #
-            #     elif len(chunk[2]) > 0:
-            #         end_index = cur_token_index + 1
-            #         sentence.add_chunk(Chunk(doc[cur_token_index: end_index], doc[cur_token_index: end_index].text))
-            #
-            #         print(f'Chunk: {sentence.chunks[-1].span}')
-            #
-            #         cur_token_index = end_index
+'''
+In-process alternative to the OpenNLP chunker (chunker = spacy), chunking the
+spaCy tags with the patterns of tagchunker.py.
+'''
+class TagPatternChunkerComponent:
+    def __init__(self, nlp: Language):
+        pass
 
+    def __call__(self, doc: Doc) -> Doc:
+        for sent in doc.sents:
+            sentence = Sentence()
+            for start, end, chunk_type in chunk_tags([token.tag_ for token in sent]):
+                sentence.add_chunk(Chunk(doc[sent.start + start: sent.start + end], chunk_type))
             doc._.sentences.append(sentence)
 
         return doc
@@ -480,17 +682,30 @@ class HarmonizerComponent:
 '''
 This is a pipeline component that extracts hypernym relations.
 '''
-@Language.factory('hypernym_analysis')
-def create_hypernym_analysis_component(nlp: Language, name: str):
+@Language.factory('hypernym_analysis', default_config = {'server_paths' : None, 'hierarchy_index' : None})
+def create_hypernym_analysis_component(nlp: Language, name: str, server_paths: Optional[dict],
+                                       hierarchy_index: Optional[str]):
     ## add properties used by SemRep
     Doc.set_extension('relations', default = [])
 
-    return HypernymAnalysisComponent(nlp)
+    return HypernymAnalysisComponent(nlp, server_paths, hierarchy_index)
 
 class HypernymAnalysisComponent:
-    def __init__(self, nlp: Language):
+    def __init__(self, nlp: Language, server_paths: dict = None, hierarchy_index: str = None):
         self.max_intranp_distance = 5 # make this a parameter
 
+        # a local ancestor index (see hierarchyindex.py) replaces the hierarchy server
+        if hierarchy_index is not None:
+            self.hierarchy = HierarchyIndex(hierarchy_index)
+            return
+
+        # IS-A answers are cached by CUI pair
+        servers = server_paths if server_paths is not None else {}
+        cache = LookupCache(int(servers.get('hierarchy_cache_size', 100000)), servers.get('hierarchy_cache_path'))
+        self.hierarchy = HierarchyClient(servers.get('host', 'localhost'), servers.get('hierarchy_port', '12349'), cache,
+                                         servers.get('hierarchy_batch', 'false').lower() == 'true',
+                                         **get_client_options(servers, 'hierarchy'))
+
     # def get_concept(self, head, concepts):
     #     for concept in concepts:
     #         if head.text == concept.span.text:
@@ -500,18 +715,35 @@ class HypernymAnalysisComponent:
     def __call__(self, doc: Doc) -> Doc:
         print('-----Start: hypernym analysis-----')
 
+        # collect the candidate pairs of the document first, so that the hierarchy
+        # is queried once for all of them
+        candidates = []
         for sentence in doc._.sentences:
             for i, chunk in enumerate(sentence.chunks):
                 # if chunk is a noun phrase
                 if chunk.chunk_type == 'NP':
-                    self.intraNP_hypernymy(chunk, doc)
-                    self.interNP_hypernymy(i, sentence, doc)
-
+                    self.intraNP_hypernymy(chunk, doc, candidates)
+                    self.interNP_hypernymy(i, sentence, doc, candidates)
+
+        pairs = []
+        for concept_1, concept_2, both_directions in candidates:
+            cui_1 = concept_1.annotation['MetamapLite'][0]['cui']
+            cui_2 = concept_2.annotation['MetamapLite'][0]['cui']
+            pairs.append((cui_1, cui_2))
+            if both_directions:
+                pairs.append((cui_2, cui_1))
+        is_a = self.hierarchy.is_a_many(pairs)
+
+        for concept_1, concept_2, both_directions in candidates:
+            self.hypernymy(doc, concept_1, concept_2, both_directions, is_a)
+
+        if self.hierarchy.cache is not None:
+            print(f'hierarchy cache: {self.hierarchy.cache.stats()}')
         print('-----End: hypernym analysis-----')
 
         return doc
 
-    def intraNP_hypernymy(self, np_chunk, doc):
+    def intraNP_hypernymy(self, np_chunk, doc, candidates):
         if len(np_chunk.span) == 1:
             return None
 
@@ -520,11 +752,11 @@ class HypernymAnalysisComponent:
         # identify modifier to the left of head
         modifier_concept = np_chunk.words[np_chunk.head_index - 1].associated_concept
 
-        self.hypernymy(doc, head_concept, modifier_concept)
+        self.add_candidate(candidates, head_concept, modifier_concept)
 
         # TO DO: coordination in new code
 
-    def interNP_hypernymy(self, np_chunk_index, sentence, doc):
+    def interNP_hypernymy(self, np_chunk_index, sentence, doc, candidates):
         np_chunk = sentence.chunks[np_chunk_index]
         np_chunk_head = np_chunk.words[np_chunk.head_index]
 
@@ -546,11 +778,15 @@ class HypernymAnalysisComponent:
                 concept_2 = next_chunk_head.associated_concept
 
                 if ip_type == 'APPOS' or ip_type == 'PAREN':
-                    self.hypernymy(doc, concept_1, concept_2)
+                    self.add_candidate(candidates, concept_1, concept_2)
                 else:
-                    self.hypernymy(doc, concept_1, concept_2, False)
+                    self.add_candidate(candidates, concept_1, concept_2, False)
 
-    def hypernymy(self, doc, concept_1, concept_2, both_directions = True):
+    def add_candidate(self, candidates, concept_1, concept_2, both_directions = True):
+        if self.is_candidate(concept_1, concept_2, both_directions):
+            candidates.append((concept_1, concept_2, both_directions))
+
+    def is_candidate(self, concept_1, concept_2, both_directions = True):
         # if head has no concept -> no hypernym rel
         if concept_1 is None or concept_2 is None:
             return False
@@ -566,21 +802,27 @@ class HypernymAnalysisComponent:
             return False
 
         # get the common semantic groups of the concepts
-        sem_groups = set(concept_1.annotation['MetamapLite'][0]['semgroups']).intersection(set(concept_2.annotation['MetamapLite'][0]['semgroups']))
+        sem_groups = concept_1.annotation['MetamapLite'][0].semgroup_mask & concept_2.annotation['MetamapLite'][0].semgroup_mask
 
         # proceed if there are any common sem groups that are not 'anat' or 'conc'
-        if len(sem_groups - set(['anat', 'conc'])) == 0:
+        if sem_groups & ~NON_HYPERNYM_SEMGROUPS == 0:
             return False
 
-        socket_client = SocketClient('ec2-3-144-241-74.us-east-2.compute.amazonaws.com', '12349')
-        if socket_client.send(concept_1.annotation['MetamapLite'][0]['cui'] + concept_2.annotation['MetamapLite'][0]['cui'], True) == 'true' and \
-                self.allowed_geoa(concept_1, concept_2):
+        return True
+
+    def hypernymy(self, doc, concept_1, concept_2, both_directions, is_a):
+        '''
+            :params
+                is_a: answers of the hierarchy for the CUI pairs (see HierarchyClient.is_a_many)
+        '''
+        cui_1 = concept_1.annotation['MetamapLite'][0]['cui']
+        cui_2 = concept_2.annotation['MetamapLite'][0]['cui']
+        if is_a[(cui_1, cui_2)] and self.allowed_geoa(concept_1, concept_2):
             print(f"Hypernymy: {concept_1.annotation['MetamapLite'][0]['concept_string']} is a {concept_2.annotation['MetamapLite'][0]['concept_string']}")
             doc._.relations.append(Relation(concept_1, 'IS-A', concept_2))
 
             return True
-        elif both_directions and socket_client.send(concept_2.annotation['MetamapLite'][0]['cui'] + concept_1.annotation['MetamapLite'][0]['cui'], True) == 'true' and \
-                self.allowed_geoa(concept_2, concept_1):
+        elif both_directions and is_a[(cui_2, cui_1)] and self.allowed_geoa(concept_2, concept_1):
             print(f"Hypernymy: {concept_2.annotation['MetamapLite'][0]['concept_string']} is a {concept_1.annotation['MetamapLite'][0]['concept_string']}")
             doc._.relations.append(Relation(concept_2, 'IS-A', concept_1))
 
@@ -677,8 +919,7 @@ class HypernymAnalysisComponent:
                     return True
 
     def allowed_geoa(self, concept_1, concept_2):
-        if 'geoa' in concept_1.annotation['MetamapLite'][0]['semtypes'] and \
-                'geoa' in concept_2.annotation['MetamapLite'][0]['semtypes']:
+        if concept_1.annotation['MetamapLite'][0].semtype_mask & concept_2.annotation['MetamapLite'][0].semtype_mask & GEOA_SEMTYPES:
             return concept_2.annotation['MetamapLite'][0]['name'].split()[-1] in GEOA_HYPERNYMS
 
         return True
@@ -686,17 +927,22 @@ class HypernymAnalysisComponent:
 '''
 This is a pipeline component that extracts other types of relations.
 '''
-@Language.factory('relational_analysis')
-def create_relational_analysis_component(nlp: Language, name: str, ontology_db_path: str):
-    return RelationalAnalysisComponent(nlp, ontology_db_path)
+@Language.factory('relational_analysis', default_config = {'ontology_db_cache' : None})
+def create_relational_analysis_component(nlp: Language, name: str, ontology_db_path: str,
+                                         ontology_db_cache: Optional[str]):
+    return RelationalAnalysisComponent(nlp, ontology_db_path, ontology_db_cache)
 
 class RelationalAnalysisComponent:
-    def __init__(self, nlp: Language, ontology_db_path: str):
-        self.ontology_db = []
-        with open(ontology_db_path, 'r') as f:
-            for line in f:
-                line = line.strip().split('|')[1]
-                self.ontology_db.append(line)
+    def __init__(self, nlp: Language, ontology_db_path: str, ontology_db_cache: str = None):
+        '''
+            :params
+                ontology_db_cache: file where the predicate index is kept between runs (optional)
+        '''
+        self.predicate_index = PredicateIndex.load(ontology_db_path, ontology_db_cache)
+
+        self.modheads = [(modhead.replace('inverse:', ''), modhead.startswith('inverse:')) for modhead in MODHEAD_TYPES]
+        self.modhead_codes = self.predicate_index.encode_predicates([modhead for modhead, inverse in self.modheads])
+        self.inverse_modheads = np.array([inverse for modhead, inverse in self.modheads], dtype = bool)
 
     def __call__(self, doc: Doc) -> Doc:
         print('-----Start: relational analysis-----')
@@ -719,7 +965,7 @@ class RelationalAnalysisComponent:
     #     return candidates
 
     def lookup(self, semtype_1, pred_type, semtype_2):
-        return '-'.join([semtype_1, pred_type, semtype_2]) in self.ontology_db
+        return self.predicate_index.allows(semtype_1, pred_type, semtype_2)
 
     def verify_and_generate(self, doc, predicates, candidate_pairs, indicator_type):
         if len(candidate_pairs) == 0:
@@ -727,31 +973,50 @@ class RelationalAnalysisComponent:
 
         # this is for noun compound interpretation
         if predicates is None:
-            for modhead in MODHEAD_TYPES:
-                inverse = False
-                if modhead.startswith('inverse:'):
-                    inverse = True
-                    modhead = modhead.replace('inverse:', '')
-                for candidate_pair in candidate_pairs:
-                    if inverse and self.lookup(candidate_pair[1], modhead,
-                                          candidate_pair[0]):
-                        # self.generate_implicit_relation(doc, modhead, indicator_type,
-                        #                         candidate_pair[1],
-                        #                         candidate_pair[0])
-                        return modhead, inverse
-                    elif self.lookup(candidate_pair[0], modhead,
-                                          candidate_pair[1]):
-                        # self.generate_implicit_relation(doc, modhead, indicator_type,
-                        #                                 candidate_pair[0],
-                        #                                 candidate_pair[1])
-                        return modhead, inverse
+            return self.verify_modheads([candidate_pairs])[0]
         return None, None
 
+    def verify_modheads(self, candidate_pair_lists):
+        '''
+            Noun compound verification of several candidate pair lists at once
+
+            The pairs of all the lists are checked against all the modhead types with
+            one lookup in the predicate array, in both directions.
+
+            :returns
+                (modhead, inverse) of each list: the first modhead type (in MODHEAD_TYPES
+                order) that a pair allows, either as object-modhead-subject for inverse
+                types or as subject-modhead-object; (None, None) if there is none
+        '''
+        pairs = [candidate_pair for candidate_pairs in candidate_pair_lists for candidate_pair in candidate_pairs]
+        subjects = self.predicate_index.encode_semtypes([candidate_pair[0] for candidate_pair in pairs])
+        objects = self.predicate_index.encode_semtypes([candidate_pair[1] for candidate_pair in pairs])
+
+        allowed = self.predicate_index.allowed_pairs(subjects, self.modhead_codes, objects)
+        inverse_allowed = self.predicate_index.allowed_pairs(objects, self.modhead_codes, subjects)
+        # (pairs x modhead types)
+        found = allowed | (inverse_allowed & self.inverse_modheads)
+
+        # modhead types found in each list, an empty list finds none
+        starts = np.cumsum([0] + [len(candidate_pairs) for candidate_pairs in candidate_pair_lists[:-1]])
+        lengths = np.array([len(candidate_pairs) for candidate_pairs in candidate_pair_lists])
+        list_found = np.zeros((len(candidate_pair_lists), len(self.modheads)), dtype = bool)
+        nonempty = lengths > 0
+        if nonempty.any():
+            list_found[nonempty] = np.logical_or.reduceat(found, starts[nonempty], axis = 0)
+
+        firsts = list_found.argmax(axis = 1)
+        results = [self.modheads[first] if any_found else (None, None)
+                   for first, any_found in zip(firsts.tolist(), list_found.any(axis = 1).tolist())]
+        return results
+
     def generate_implicit_relation(self, doc, modhead, indicator_type, subject, object):
         print(f"Noun compound: {subject.annotation['MetamapLite'][0]['concept_string']} {modhead} {object.annotation['MetamapLite'][0]['concept_string']}")
         doc._.relations.append(Relation(subject, modhead.upper(), object))
 
     def noun_compound_interpretation(self, doc, sentence, chunk):
+        # (word, prev_word, candidate_pairs) of each modifier-head pair, verified together below
+        candidates = []
         for i in range(len(chunk.words) - 1, -1, -1):  # in reverse
             word = chunk.words[i]
             if word.chunk_role == 'H' or word.chunk_role == 'M':
@@ -803,17 +1068,21 @@ class RelationalAnalysisComponent:
                     # if hypenated_adj:
                     #     found = verifyAndGenerate(doc, sent, preds, pairs, IndicatorType.ADJECTIVE)
                     # else:
-                modhead, inverse = self.verify_and_generate(doc, None, candidate_pairs, 'MODHEAD')
-                if modhead is not None:
-                    if inverse:
-                        self.generate_implicit_relation(doc, modhead, None,
-                                                        word.associated_concept,
-                                                        prev_word.associated_concept)
-                    else:
-                        self.generate_implicit_relation(doc, modhead, None,
-                                                        prev_word.associated_concept,
-                                                        word.associated_concept)
-                    return None
+                candidates.append((word, prev_word, candidate_pairs))
+
+        # the first pair (from the head) with a modhead relation gives the relation
+        results = self.verify_modheads([candidate_pairs for word, prev_word, candidate_pairs in candidates])
+        for (word, prev_word, candidate_pairs), (modhead, inverse) in zip(candidates, results):
+            if modhead is not None:
+                if inverse:
+                    self.generate_implicit_relation(doc, modhead, None,
+                                                    word.associated_concept,
+                                                    prev_word.associated_concept)
+                else:
+                    self.generate_implicit_relation(doc, modhead, None,
+                                                    prev_word.associated_concept,
+                                                    word.associated_concept)
+                return None
 
         modifiers = []
         for modifier in modifiers:
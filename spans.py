@@ -0,0 +1,123 @@
+from bisect import bisect_left, bisect_right
+
+def fuse_spans(spans):
+    '''
+        Longest-span-first fusion of overlapping annotations
+
+        Spans are visited from the longest to the shortest (spans of the same length
+        in input order) and a span is kept if it does not overlap any span kept
+        before it. The kept spans never overlap, so a candidate only has to be
+        compared with the kept span starting at or before it and the one starting
+        after it. The kept starts are counted in a Fenwick tree over the sorted
+        starts of all spans, which finds both neighbours and adds a start in
+        O(log n), O(n log n) in total.
+
+        :params
+            spans: iterable of (start, end) character offsets, end exclusive
+        :returns
+            list of the kept spans, in the order in which they were kept
+    '''
+    # sorting is stable, spans of the same length keep their input order
+    candidates = sorted(spans, key = lambda span: span[0] - span[1])
+
+    # positions in the tree
+    starts = sorted(set(start for start, end in candidates))
+    # end of the kept span at each position
+    ends = [None] * len(starts)
+    kept = FenwickTree(len(starts))
+
+    fused = []
+    for start, end in candidates:
+        # an empty span covers no character and cannot overlap anything
+        if end > start:
+            i = bisect_left(starts, start)
+            before = kept.prefix_count(i + 1)
+            # last kept span starting at or before the start
+            if before > 0 and ends[kept.find(before)] > start:
+                continue
+            # kept span starting inside the span
+            if kept.prefix_count(bisect_left(starts, end)) > before:
+                continue
+
+            kept.add(i)
+            ends[i] = end
+        fused.append((start, end))
+
+    return fused
+
+class FenwickTree:
+    '''
+        Counts of positions 0..size - 1, updated and queried in O(log size)
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, position):
+        i = position + 1
+        while i <= self.size:
+            self.tree[i] += 1
+            i += i & -i
+
+    def prefix_count(self, end):
+        '''
+            Count of the positions before end
+        '''
+        count = 0
+        i = end
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+        return count
+
+    def find(self, k):
+        '''
+            Position of the k-th counted position (k >= 1)
+        '''
+        i = 0
+        step = 1 << self.size.bit_length()
+        while step > 0:
+            if i + step <= self.size and self.tree[i + step] < k:
+                i += step
+                k -= self.tree[i]
+            step >>= 1
+        return i
+
+class TokenOffsetIndex:
+    '''
+        Maps character offsets to token indices with binary search
+
+        Built once per Doc from the sorted start and end offsets of its tokens.
+        A character span is mapped to the tokens it overlaps: a start offset that
+        falls in whitespace moves forward to the next token, an end offset that
+        falls in whitespace moves back to the previous token, and offsets inside a
+        token extend the span to the whole token.
+    '''
+    def __init__(self, offsets):
+        '''
+            :params
+                offsets: (start, end) character offsets of the tokens, in order, end exclusive
+        '''
+        self.starts = [start for start, _ in offsets]
+        self.ends = [end for _, end in offsets]
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls([(token.idx, token.idx + len(token)) for token in doc])
+
+    def token_span(self, char_start_index, char_end_index):
+        '''
+            :params
+                char_start_index, char_end_index: character span, end exclusive
+            :returns
+                (token_start_index, token_end_index), end exclusive, or None if the span
+                does not overlap any token (e.g. it is empty or only covers whitespace)
+        '''
+        # first token ending after the span start
+        token_start_index = bisect_right(self.ends, char_start_index)
+        # number of tokens starting before the span end
+        token_end_index = bisect_left(self.starts, char_end_index)
+
+        if token_start_index >= token_end_index:
+            return None
+        return token_start_index, token_end_index
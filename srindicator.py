@@ -1,5 +1,4 @@
 import xml.etree.ElementTree as ET
-from spacy.tokens import Token
 
 class SRIndicator:
     """
@@ -40,8 +39,8 @@ class SRIndicator:
                 input(self.string)
 
         self.seminfo = []
-        for seminfo_xml in srindicator_xml.find('SemInfo'):
-            seminfo.append(SemInfo(seminfo_xml))
+        for seminfo_xml in srindicator_xml.findall('SemInfo'):
+            self.seminfo.append(SemInfo(seminfo_xml))
 
 class SemInfo:
     """
@@ -50,47 +49,28 @@ class SemInfo:
     """
 
     def __init__(self, seminfo_xml):
-        self.category = srindicator_xml.attrib['category']
-        self.cue = srindicator_xml.attrib['cue']
-        self.inverse = srindicator_xml.attrib['inverse']
-        self.negated = srindicator_xml.attrib['negated']
+        self.category = seminfo_xml.attrib['category']
+        # a few records only have the category
+        self.cue = seminfo_xml.attrib.get('cue', '')
+        self.inverse = seminfo_xml.attrib.get('inverse', 'false')
+        self.negated = seminfo_xml.attrib.get('negated', 'false')
 
 def parse_semrules_file(filename):
     tree = ET.parse(filename)
     root = tree.getroot()
 
-    srindicators_list = []
-    srindicator_lemmas = {}
-    for i, srindicator_xml in enumerate(root.findall('SRIndicator')):
-        srindicator = SRIndicator(srindicator_xml)
-        srindicators_list.append(srindicator)
+    srindicators_list = [SRIndicator(srindicator_xml) for srindicator_xml in root.findall('SRIndicator')]
+    return srindicators_list, index_first_lemmas(srindicators_list)
 
+def index_first_lemmas(srindicators_list):
+    """
+        {lexeme_type : {first lemma : [positions in srindicators_list]}}
+    """
+    srindicator_lemmas = {}
+    for i, srindicator in enumerate(srindicators_list):
         if srindicator.lexeme_type not in srindicator_lemmas:
             srindicator_lemmas[srindicator.lexeme_type] = {}
         if srindicator.lexeme[0]['lemma'] not in srindicator_lemmas[srindicator.lexeme_type]:
             srindicator_lemmas[srindicator.lexeme_type][srindicator.lexeme[0]['lemma']] = []
         srindicator_lemmas[srindicator.lexeme_type][srindicator.lexeme[0]['lemma']].append(i)
-    return srindicators_list, srindicator_lemmas
-
-def annotate_indicators(spacy_sentence, srindicators_list, srindicator_lemmas):
-    indicator_getter = lambda token: token.text in ("apple", "pear", "banana")
-
-    lexeme_type_order = ['gapped', 'multiword', 'single']
-
-    indicators = []
-    for lexeme_type in lexeme_type_order:
-        for token in spacy_sentence:
-            if token.lemma_ in srindicator_lemmas[lexeme_type]:
-                if lexeme_type == 'gapped':
-                   for next_token in spacy_sentence[token.i + 1:]:
-                       if next_token.lemma_ == srindicator_lemmas[lexeme_type][token.lemma_]:
-                           pass
-                elif lexeme_type == 'multiword':
-                    for next_token in spacy_sentence[token.i + 1:]:
-                        if next_token.lemma_ == srindicator_lemmas[lexeme_type][token.lemma_]:
-                            pass
-                else:
-                    Token.set_extension('is_indicator', default = True, force = True)
-                    indicators.append(token.i)
-
-    return indicators
\ No newline at end of file
+    return srindicator_lemmas
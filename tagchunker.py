@@ -0,0 +1,58 @@
+import re
+
+# one letter per tag, so that chunk patterns are regular expressions over a string
+TAG_CODES = {
+    'NN' : 'N', 'NNS' : 'N', 'NNP' : 'N', 'NNPS' : 'N',
+    'PRP' : 'O', 'EX' : 'O',
+    'JJ' : 'J', 'JJR' : 'J', 'JJS' : 'J', 'AFX' : 'J',
+    'CD' : 'C',
+    'DT' : 'D', 'PDT' : 'D', 'WDT' : 'D',
+    'PRP$' : 'P', 'WP$' : 'P', 'POS' : 'S',
+    'HYPH' : 'H',
+    'RB' : 'R', 'RBR' : 'R', 'RBS' : 'R',
+    'MD' : 'M',
+    'VB' : 'V', 'VBD' : 'V', 'VBP' : 'V', 'VBZ' : 'V',
+    'VBG' : 'G', 'VBN' : 'B',
+    'IN' : 'I', 'TO' : 'T',
+    'CC' : 'K',
+    '-LRB-' : 'L', '-RRB-' : 'Q',
+}
+OTHER_CODE = 'x'
+
+# tried in order at each token, the first (longest) match makes a chunk
+CHUNK_PATTERNS = [
+    # determiners and possessives, modifiers (participles only before the first noun),
+    # then nouns or numbers, with parenthesized abbreviations (e.g. rheumatoid arthritis (RA))
+    # and coordinated nouns as in SemRep; or a pronoun
+    ('NP', r'[DP]*[JCGBHR]*[NC](?:[HS]*[JCR]*[NC]|L[JCNH]+Q|K[DP]*[JCR]*[NC])*|O'),
+    # auxiliaries and adverbs, then verbs (with to before a verb)
+    ('VP', r'(?:T(?=R*[VGB]))?[MR]*[VGB](?:R*(?:[VGB]|T(?=R*[VGB])))*'),
+    ('PP', r'[IT]'),
+    ('ADJP', r'R*J+'),
+    ('ADVP', r'R+'),
+]
+CHUNK_PATTERN = re.compile('|'.join(f'(?P<{chunk_type}>{pattern})' for chunk_type, pattern in CHUNK_PATTERNS))
+
+def chunk_tags(tags):
+    '''
+        Rule-based chunking of a tagged sentence
+
+        :params
+            tags: Penn Treebank tags of the tokens
+        :returns
+            (start, end, chunk_type) of each chunk, end exclusive; a token outside of
+            any phrase is a chunk of its own typed by its tag (as in the OpenNLP output)
+    '''
+    codes = ''.join(TAG_CODES.get(tag, OTHER_CODE) for tag in tags)
+
+    chunks = []
+    start = 0
+    while start < len(codes):
+        match = CHUNK_PATTERN.match(codes, start)
+        if match is None or match.end() == start:
+            chunks.append((start, start + 1, tags[start]))
+            start += 1
+        else:
+            chunks.append((start, match.end(), match.lastgroup))
+            start = match.end()
+    return chunks
@@ -0,0 +1,76 @@
+import sys
+sys.path.append('..')
+import time
+
+from cache import CachedAnnotator, LookupCache, MISSING
+
+def test_negative_caching():
+    cache = LookupCache(maxsize = 2)
+
+    assert cache.get('the') is MISSING
+    cache.set('the', None)
+    assert cache.get('the') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_lru_eviction():
+    cache = LookupCache(maxsize = 2)
+    cache.set('patients', [1])
+    cache.set('treatment', [2])
+    cache.get('patients')
+    cache.set('the', None)
+
+    assert cache.get('treatment') is MISSING
+    assert cache.get('patients') == [1]
+
+def test_disk_tier(tmp_path):
+    path = str(tmp_path / 'lookups.db')
+    cache = LookupCache(maxsize = 10, path = path)
+    cache.set('patients', ['patient'])
+    cache.set('xyz', None)
+    cache.close()
+
+    cache = LookupCache(maxsize = 10, path = path)
+    assert cache.get('patients') == ['patient']
+    assert cache.get('xyz') is None
+    assert cache.stats()['disk_hits'] == 2
+
+def test_ttl():
+    cache = LookupCache(maxsize = 10, ttl = 0.05)
+    cache.set('patients', ['patient'])
+    assert cache.get('patients') == ['patient']
+    time.sleep(0.1)
+    assert cache.get('patients') is MISSING
+
+def test_disk_eviction(tmp_path):
+    path = str(tmp_path / 'lookups.db')
+    cache = LookupCache(maxsize = 0, path = path, max_disk_entries = 2)
+    for key in ['patients', 'treatment', 'the']:
+        cache.set(key, key)
+        time.sleep(0.01)
+    cache.prune()
+
+    assert cache.get('patients') is MISSING
+    assert cache.get('treatment') == 'treatment'
+    assert cache.get('the') == 'the'
+
+class CountingAnnotator:
+    def __init__(self):
+        self.calls = 0
+
+    def annotate(self, text):
+        self.calls += 1
+        return {(0, len(text)) : [{'cui' : 'C0030705'}]}
+
+def test_cached_annotator():
+    cache = LookupCache()
+    annotator = CountingAnnotator()
+    metamaplite = CachedAnnotator(annotator, 'MetamapLite', '2020AA', cache)
+
+    assert metamaplite.annotate('patients') == {(0, 8) : [{'cui' : 'C0030705'}]}
+    assert metamaplite.annotate('patients') == {(0, 8) : [{'cui' : 'C0030705'}]}
+    assert annotator.calls == 1
+
+    # another ontology or server version does not share the entries
+    CachedAnnotator(annotator, 'MetamapLite', '2021AA', cache).annotate('patients')
+    CachedAnnotator(annotator, 'GNormPlus', '2020AA', cache).annotate('patients')
+    assert annotator.calls == 3
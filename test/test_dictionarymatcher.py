@@ -0,0 +1,31 @@
+import sys
+sys.path.append('..')
+
+from dictionarymatcher import DictionaryConceptMatcher
+
+CONCEPT_TABLE = 'C0002771\tAnalgesics\tanalgesic|analgesics\thops::orch::phsu\ttmod::tmod::tmod\n' \
+                'C0004057\tAspirin\taspirin|acetylsalicylic acid\torch::phsu\ttmod::tmod\n' \
+                'C0001128\tAcids\tacid\tinch\tchem\n'
+
+def test_annotate(tmp_path):
+    table_path = tmp_path / 'concepts.tsv'
+    table_path.write_text(CONCEPT_TABLE)
+    matcher = DictionaryConceptMatcher(str(table_path))
+
+    annotations = matcher.annotate('Analgesic Acetylsalicylic acid, not an acid-base pair.')
+
+    assert sorted(annotations) == [(0, 9), (10, 20), (39, 4)]
+    assert annotations[(10, 20)][0]['cui'] == 'C0004057'
+    assert annotations[(10, 20)][0]['concept_string'] == 'Acetylsalicylic acid'
+    assert annotations[(0, 9)][0]['semtypes'] == ('hops', 'orch', 'phsu')
+
+    # the pickled index gives the same matches
+    matcher.save(str(tmp_path / 'concepts.pickle'))
+    assert DictionaryConceptMatcher(str(tmp_path / 'concepts.pickle')).annotate('aspirin') == matcher.annotate('aspirin')
+
+def test_no_concept_table():
+    try:
+        DictionaryConceptMatcher(None)
+        assert False
+    except ValueError as e:
+        assert 'concept_table' in str(e)
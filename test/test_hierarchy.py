@@ -0,0 +1,93 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+
+from hierarchy import HierarchyClient
+from hierarchyindex import build_index, closure, read_ancestors, HierarchyIndex
+from replayserver import Fixtures, ReplayServer
+
+def test_is_a_many():
+    fixtures = Fixtures()
+    # arthritis is a disease
+    fixtures.record('hierarchy', 'C0003864C0012634', 'true')
+    fixtures.record('hierarchy', 'C0012634C0003864', 'false')
+    server = ReplayServer('hierarchy', fixtures).start()
+
+    hierarchy = HierarchyClient('localhost', server.port)
+    pairs = [('C0003864', 'C0012634'), ('C0012634', 'C0003864'), ('C0003864', 'C0012634')]
+    assert hierarchy.is_a_many(pairs) == {('C0003864', 'C0012634') : True, ('C0012634', 'C0003864') : False}
+    assert server.requests == 2
+
+    # answers are cached
+    assert hierarchy.is_a('C0012634', 'C0003864') is False
+    assert server.requests == 2
+
+    server.shutdown()
+
+def test_is_a_many_batch():
+    fixtures = Fixtures()
+    fixtures.record('hierarchy', 'C0003864C0012634\nC0012634C0003864\nC0004057C0002771', 'true\nfalse\ntrue')
+    fixtures.record('hierarchy', 'C0002771C0004057', 'false')
+    upstream = ReplayServer('hierarchy', fixtures).start()
+
+    # the batch requests are recorded and replayed whole
+    recorded = Fixtures()
+    recorder = ReplayServer('hierarchy', recorded, upstream = ('localhost', upstream.port)).start()
+    pairs = [('C0003864', 'C0012634'), ('C0012634', 'C0003864'), ('C0004057', 'C0002771')]
+    answers = {('C0003864', 'C0012634') : True, ('C0012634', 'C0003864') : False, ('C0004057', 'C0002771') : True}
+    assert HierarchyClient('localhost', recorder.port, batch = True).is_a_many(pairs) == answers
+
+    server = ReplayServer('hierarchy', recorded).start()
+    hierarchy = HierarchyClient('localhost', server.port, batch = True)
+    assert hierarchy.is_a_many(pairs) == answers
+    assert server.requests == 1 and recorded.misses == 0
+
+    # only the pairs that are not cached are sent
+    pairs.append(('C0002771', 'C0004057'))
+    recorded.record('hierarchy', 'C0002771C0004057', 'false')
+    assert hierarchy.is_a_many(pairs)[('C0002771', 'C0004057')] is False
+    assert server.requests == 2
+
+    for replay_server in [upstream, recorder, server]:
+        replay_server.shutdown()
+
+def test_hierarchy_index(tmp_path):
+    # arthritis -> joint disease -> musculoskeletal disease -> disease
+    (tmp_path / 'parents.txt').write_text('C0003864|C0022408\nC0022408|C0026857\nC0026857|C0012634\n'
+                                          'C0012634|C0012634\nnot a cui|C0012634\n')
+    ancestors = read_ancestors(str(tmp_path / 'parents.txt'), parents = True)
+    build_index(ancestors, str(tmp_path / 'hierarchy.idx'))
+
+    hierarchy = HierarchyIndex(str(tmp_path / 'hierarchy.idx'))
+    assert hierarchy.is_a('C0003864', 'C0012634')
+    assert hierarchy.is_a('C0022408', 'C0026857')
+    assert not hierarchy.is_a('C0012634', 'C0003864')
+    assert not hierarchy.is_a('C0012634', 'C0012634')
+    assert not hierarchy.is_a('C9999999', 'C0012634')
+    assert hierarchy.is_a_many([('C0003864', 'C0022408')]) == {('C0003864', 'C0022408') : True}
+    hierarchy.close()
+
+def test_closure_diamond():
+    # 1 -> 3 -> 2 -> 4 and 1 -> 2, 2 is reached by two paths
+    assert closure({1 : [2, 3], 3 : [2], 2 : [4]}) == {1 : {2, 3, 4}, 2 : {4}, 3 : {2, 4}, 4 : set()}
+    # the order in which the concepts are visited does not matter
+    assert closure({3 : [2], 1 : [3, 2], 2 : [4]})[3] == {2, 4}
+
+def test_closure_multiple_parents(tmp_path):
+    # rheumatoid arthritis is an arthritis and an autoimmune disease, both are diseases
+    (tmp_path / 'parents.txt').write_text('C0003873|C0003864\nC0003873|C0004364\n'
+                                          'C0003864|C0012634\nC0004364|C0012634\n')
+    ancestors = read_ancestors(str(tmp_path / 'parents.txt'), parents = True)
+    assert ancestors[3873] == {3864, 4364, 12634}
+    build_index(ancestors, str(tmp_path / 'hierarchy.idx'))
+
+    hierarchy = HierarchyIndex(str(tmp_path / 'hierarchy.idx'))
+    assert hierarchy.is_a('C0003873', 'C0004364')
+    assert hierarchy.is_a('C0003873', 'C0012634')
+    assert hierarchy.is_a('C0004364', 'C0012634')
+    assert not hierarchy.is_a('C0003864', 'C0004364')
+    hierarchy.close()
+
+def test_closure_cycle():
+    # a cycle ends the search instead of looping
+    assert closure({1 : [2], 2 : [1]})[2] == {1}
@@ -0,0 +1,100 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+
+import os
+import spacy
+from spacy.tokens import Doc
+
+import spacy_components
+
+from indicatorindex import IndicatorIndex
+from srindicator import parse_semrules_file
+
+SEMRULES = 'resources/semrules2020.xml'
+
+def test_index():
+    index = IndicatorIndex.load(SEMRULES)
+
+    abate = index.get_single('abate')
+    assert len(abate) == 1
+    assert [seminfo.category for seminfo in abate[0].seminfo] == ['affects', 'disrupts']
+
+    # lexemes listed head first in the rules file, indexed in text order
+    assert [indicator.string for indicator in index.get_multiword(['therapeutic', 'action'])] == ['therapeutic action']
+    assert index.get_multiword(['action', 'therapeutic']) == []
+    assert len(index.get_multiword(['due', 'to'])) > 0
+    assert len(index.get_multiword(['co', '-', 'express'])) > 0
+
+    risk = index.get_gapped('increase', 'risk')
+    assert [indicator.string for indicator in risk] == ['increase;risk']
+    assert index.get_gapped('risk', 'increase') == []
+
+def test_semrules_file():
+    index = IndicatorIndex.load(SEMRULES)
+    srindicators_list, srindicator_lemmas = parse_semrules_file(SEMRULES)
+    assert [indicator.string for indicator in index.indicators] == [indicator.string for indicator in srindicators_list]
+    assert index.lemmas == srindicator_lemmas
+
+def test_cache(tmp_path):
+    semrules = str(tmp_path / 'semrules.xml')
+    cache_path = str(tmp_path / 'cache' / 'semrules.pickle')  # the directory is created
+    with open(SEMRULES, 'r') as f:
+        rules = f.read()
+    with open(semrules, 'w') as f:
+        f.write(rules)
+
+    index = IndicatorIndex.load(semrules, cache_path)
+    assert os.path.exists(cache_path)
+    cached = IndicatorIndex.load(semrules, cache_path)
+    assert len(cached.indicators) == len(index.indicators)
+    assert cached.get_single('abate')[0].seminfo[0].category == 'affects'
+
+    # rebuilt when the content changes
+    with open(semrules, 'w') as f:
+        f.write(rules.replace('lemma="abate"', 'lemma="abatement"'))
+    rebuilt = IndicatorIndex.load(semrules, cache_path)
+    assert rebuilt.get_single('abate') == []
+    assert len(rebuilt.get_single('abatement')) == 1
+
+def match_strings(index, words, lemmas, tags):
+    return [(parts, indicator.string) for parts, indicator in index.match(lemmas, [word.lower() for word in words], tags)]
+
+def test_match():
+    index = IndicatorIndex.load(SEMRULES)
+
+    words = ['Aspirin', 'increased', 'the', 'risk', 'of', 'bleeding', 'due', 'to', 'its', 'inhibitory', 'effect']
+    lemmas = ['aspirin', 'increase', 'the', 'risk', 'of', 'bleeding', 'due', 'to', 'its', 'inhibitory', 'effect']
+    tags = ['NN', 'VBD', 'DT', 'NN', 'IN', 'NN', 'IN', 'IN', 'PRP$', 'JJ', 'NN']
+    matches = match_strings(index, words, lemmas, tags)
+
+    assert ([(1, 2), (3, 4)], 'increase;risk') in matches
+    assert ([(6, 8)], 'due to') in matches
+    assert ([(9, 11)], 'inhibitory effect') in matches
+    # covered by the multiword indicators
+    assert all(parts != [(10, 11)] and parts != [(7, 8)] for parts, string in matches)
+    assert [parts[0][0] for parts, string in matches] == sorted(parts[0][0] for parts, string in matches)
+
+    # the part of speech of single indicators
+    noun = index.match(['block'], ['block'], ['NN'])
+    verb = index.match(['block'], ['block'], ['VBZ'])
+    assert len(noun) == 1 and noun[0][1].lexeme[0]['pos'] == 'NN'
+    assert len(verb) == 1 and verb[0][1].lexeme[0]['pos'] == 'VB'
+
+    # no gapped indicator without its first part
+    assert ([(1, 2), (3, 4)], 'increase;risk') not in match_strings(index, words[2:], lemmas[2:], tags[2:])
+
+def test_component():
+    nlp = spacy.blank('en')
+    component = nlp.add_pipe('srindicator', config = {'semrules' : SEMRULES})
+
+    words = ['Aspirin', 'reduces', 'the', 'risk', 'of', 'stroke', '.', 'It', 'inhibits', 'platelets', '.']
+    lemmas = ['aspirin', 'reduce', 'the', 'risk', 'of', 'stroke', '.', 'it', 'inhibit', 'platelet', '.']
+    tags = ['NN', 'VBZ', 'DT', 'NN', 'IN', 'NN', '.', 'PRP', 'VBZ', 'NNS', '.']
+    sent_starts = [True] + [False] * 6 + [True] + [False] * 3
+    doc = component(Doc(nlp.vocab, words = words, lemmas = lemmas, tags = tags, sent_starts = sent_starts))
+
+    indicators = [(indicator.span.text, [span.text for span in indicator.spans]) for indicator in doc._.indicators]
+    assert ('reduces the risk', ['reduces', 'risk']) in indicators
+    assert ('inhibits', ['inhibits']) in indicators
+    assert all(len(indicator.seminfo) > 0 for indicator in doc._.indicators)
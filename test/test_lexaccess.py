@@ -1,8 +1,73 @@
 import sys
 sys.path.append('..')
+sys.path.append('server')
 
+import importlib.util
+import os
+import stat
+import threading
 import xml.etree.ElementTree as ET
-from lexaccess import LexAccess
+
+from jsonrpclib.jsonrpc import ServerProxy
+import pexpect
+import spacy
+from spacy.tokens import Doc
+
+import spacy_components
+from lexaccess import LexAccess, LexAccessSession, read_lexrecords, split_lexrecords
+
+# the server module has the name of the client module (and the server package imports
+# modules that are not installed), so it is loaded from its file
+spec = importlib.util.spec_from_file_location('lexaccess_server', 'server/lexaccess/lexaccess.py')
+lexaccess_server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(lexaccess_server)
+
+# stands in for the lexAccess launcher: one <lexRecords> document per input line (after a
+# banner in a terminal), every received term is logged; "hang" never answers and "exit"
+# ends the process
+FAKE_LEXACCESS = '''#!{python}
+import sys
+import time
+
+LEXICON = {{'sex' : 'E0055486', 'sex hormone' : 'E0055508', 'sex hormone binding' : 'E0000001',
+           'sex hormone binding globulin' : 'E0000002', 'patient' : 'E0046024'}}
+
+if sys.stdin.isatty():
+    print('lexAccess banner', flush = True)
+for line in sys.stdin:
+    term = line.strip()
+    with open({log!r}, 'a') as log:
+        log.write(term + '\\n')
+    if term == 'hang':
+        time.sleep(60)
+    if term == 'exit':
+        sys.exit(1)
+    if term.lower() in LEXICON:
+        print('<?xml version="1.0" encoding="UTF-8"?>', flush = True)
+        print(f'<lexRecords><lexRecord><base>{{term.lower()}}</base><eui>{{LEXICON[term.lower()]}}</eui>'
+              '<cat>noun</cat></lexRecord></lexRecords>', flush = True)
+    else:
+        print('<?xml version="1.0" encoding="UTF-8"?>', flush = True)
+        print('<lexRecords/>', flush = True)
+'''
+
+def write_fake_lexaccess(tmp_path):
+    '''
+        :returns
+            (path of the launcher, path of the log of received terms)
+    '''
+    path = str(tmp_path / 'lexAccess')
+    log_path = str(tmp_path / 'lexAccess.log')
+    with open(path, 'w') as f:
+        f.write(FAKE_LEXACCESS.format(python = sys.executable, log = log_path))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path, log_path
+
+def received_terms(log_path):
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, 'r') as f:
+        return [line.rstrip('\n') for line in f]
 
 def test_lookup():
     lexaccess = LexAccess({'host' : 'localhost', 'port' : 8085})
@@ -11,6 +76,22 @@ def test_lookup():
     assert(isinstance(val, list))
     assert (isinstance(val[0], ET.Element))
 
+def test_split_lexrecords():
+    output = b'''<?xml version="1.0" encoding="UTF-8"?>
+<lexRecords>
+  <lexRecord>
+    <base>sex hormone</base>
+    <eui>E0055508</eui>
+    <cat>noun</cat>
+  </lexRecord>
+</lexRecords>
+<?xml version="1.0" encoding="UTF-8"?>
+<lexRecords/>
+'''
+    documents = split_lexrecords(output, 2)
+    assert ET.fromstring(documents[0]).find('lexRecord/eui').text == 'E0055508'
+    assert ET.fromstring(documents[1]).findall('lexRecord') == []
+
 def test_parse_lexrecords():
     xml_string =  '''
     <?xml version="1.0" encoding="UTF-8"?>
@@ -47,4 +128,179 @@ def test_parse_lexrecords():
     '''
     print(xml_string)
     # parse_lexrecords
-test_parse_lexrecords()
\ No newline at end of file
+    lexrecords = read_lexrecords(xml_string)
+    assert [(lexrecord.eui, lexrecord.cat) for lexrecord in lexrecords] == [('E0055486', 'noun'), ('E0055487', 'verb')]
+    assert lexrecords[0].infl_vars is None
+
+    lexrecords = read_lexrecords(xml_string, infl_vars = True)
+    assert ('sexes', 'plural') in lexrecords[0].infl_vars
+
+    lexaccess = LexAccess('lexAccess', cache_size = 0)
+    assert [lexrecord.cat for lexrecord in lexaccess.parse_lexrecords(lexrecords, 'sex', 'NN')] == ['noun']
+
+def test_lexmatcher_longer_than_max_ngram(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    # registered again by the factory
+    if Doc.has_extension('lexmatches'):
+        Doc.remove_extension('lexmatches')
+
+    nlp = spacy.blank('en')
+    nlp.add_pipe('lexmatcher', config = {'path' : path})
+    words = ['Sex', 'hormone', 'binding', 'globulin', 'in', 'patient']
+    tags = ['NN', 'NN', 'NN', 'NN', 'IN', 'NN']
+    results = []
+    for max_ngram in [0, 2]:
+        lexmatcher = spacy_components.LexMatcherComponent(nlp, path, 'subprocess', cache_size = 0, max_ngram = max_ngram)
+        doc = Doc(nlp.vocab, words = words, tags = tags, sent_starts = [True] + [False] * (len(words) - 1))
+        doc._.lexmatches = []
+        doc = lexmatcher(doc)
+        results.append([(lexmatch.span.text, lexmatch.lexrecord[0].eui) for lexmatch in doc._.lexmatches])
+
+    # the 4-token term is matched with a batch of 2-grams too
+    assert results[0] == [('Sex hormone binding globulin', 'E0000002'), ('patient', 'E0046024')]
+    assert results[1] == results[0]
+
+def test_session_framing(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    session = LexAccessSession(path, timeout = 5)
+    try:
+        # the banner is not part of the answer, each answer ends with its record set
+        assert read_lexrecords(session.lookup('sex hormone'))[0].eui == 'E0055508'
+        assert read_lexrecords(session.lookup('hormone')) is None
+        assert [read_lexrecords(response)[0].eui for response in session.lookup_many(['sex', 'patient'])] == \
+               ['E0055486', 'E0046024']
+    finally:
+        session.close()
+
+def test_session_timeout(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    session = LexAccessSession(path, timeout = 1)
+    try:
+        for _ in range(2):
+            try:
+                session.lookup('hang')
+                assert False
+            except RuntimeError:
+                pass
+        # the term is sent once, then fails without waiting
+        assert received_terms(log_path).count('hang') == 1
+
+        # the restarted process answers
+        assert read_lexrecords(session.lookup('sex'))[0].eui == 'E0055486'
+    finally:
+        session.close()
+
+def test_session_exit(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    session = LexAccessSession(path, timeout = 5)
+    try:
+        # a process that exited between lookups is restarted and the term is sent again
+        session.process.terminate(force = True)
+        assert read_lexrecords(session.lookup('sex'))[0].eui == 'E0055486'
+
+        # a term that ends the process is sent twice, then fails
+        try:
+            session.lookup('exit')
+            assert False
+        except RuntimeError:
+            pass
+        assert received_terms(log_path).count('exit') == 2
+        assert read_lexrecords(session.lookup('patient'))[0].eui == 'E0046024'
+    finally:
+        session.close()
+
+def test_session_pool(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    lexaccess = LexAccess(path, 'session', workers = 2, timeout = 1, cache_size = 0)
+    try:
+        texts = ['sex', 'hormone', 'patient', 'sex hormone', 'sex hormone binding']
+        responses = lexaccess.lookup_many(texts)
+        assert [lexrecords[0].eui if lexrecords else None for lexrecords in map(read_lexrecords, responses)] == \
+               ['E0055486', None, 'E0046024', 'E0055508', 'E0000001']
+
+        # a term that hangs one session is not sent to the other one
+        assert lexaccess.get_matches('hang') is None
+        assert lexaccess.get_matches('hang') is None
+        assert received_terms(log_path).count('hang') == 1
+
+        matches = lexaccess.get_matches_batch(texts + ['hang'])
+        assert [matches[text][0].eui if matches[text] else None for text in texts] == \
+               ['E0055486', None, 'E0046024', 'E0055508', 'E0000001']
+        assert matches['hang'] is None
+    finally:
+        lexaccess.close()
+
+def test_cluster_server(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    cluster = lexaccess_server.LexAccessCluster(path, workers = 2, timeout = 5)
+    server = lexaccess_server.ThreadedJSONRPCServer(('localhost', 0), logRequests = False)
+    server.register_function(cluster.parse)
+    server.register_function(cluster.parse_many)
+    server.register_function(cluster.health)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    try:
+        proxy = ServerProxy('http://localhost:%d' % server.server_address[1])
+
+        assert read_lexrecords(proxy.parse('sex hormone'))[0].eui == 'E0055508'
+
+        texts = ['sex', 'hormone', 'patient', 'sex hormone', 'sex hormone binding'] * 4
+        responses = proxy.parse_many(texts)
+        assert [lexrecords[0].eui if lexrecords else None for lexrecords in map(read_lexrecords, responses)] == \
+               ['E0055486', None, 'E0046024', 'E0055508', 'E0000001'] * 4
+
+        # the batch was split over both children
+        health = proxy.health()
+        assert health['pending'] == 0
+        assert [child['alive'] for child in health['children']] == [True, True]
+        assert all(child['answered'] >= 10 for child in health['children'])
+    finally:
+        server.shutdown()
+        server.server_close()
+        for child in cluster.children:
+            child.process.terminate(force = True)
+
+def test_cluster_batches(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    cluster = lexaccess_server.LexAccessCluster(path, workers = 1, timeout = 1, batch_size = 4, batch_window = 0.5)
+    try:
+        # single requests are merged up to batch_size, a part is cut to fit
+        futures = [cluster.submit([text])[0] for text in ['sex', 'patient', 'hormone']]
+        futures.extend(cluster.submit(['sex hormone', 'sex', 'patient']))
+        responses = [future.result() for future in futures]
+        assert [lexrecords[0].eui if lexrecords else None for lexrecords in map(read_lexrecords, responses)] == \
+               ['E0055486', 'E0046024', None, 'E0055508', 'E0055486', 'E0046024']
+        assert cluster.health()['children'][0]['batches'] == 2
+
+        # a text that hangs the child is not sent again after the restart
+        try:
+            cluster.parse('hang')
+            assert False
+        except pexpect.TIMEOUT:
+            pass
+        assert received_terms(log_path).count('hang') == 1
+        assert cluster.health()['children'][0]['restarts'] == 1
+        assert read_lexrecords(cluster.parse('sex'))[0].eui == 'E0055486'
+    finally:
+        for child in cluster.children:
+            child.process.terminate(force = True)
+
+def test_cache_key(tmp_path):
+    path, log_path = write_fake_lexaccess(tmp_path)
+    cache_path = str(tmp_path / 'lookups.db')
+
+    lexaccess = LexAccess(path, cache_size = 0, cache_path = cache_path)
+    assert lexaccess.get_matches('sex')[0].eui == 'E0055486'
+    lexaccess.close()
+
+    # the same configuration reads the persistent cache
+    lexaccess = LexAccess(path, cache_size = 0, cache_path = cache_path)
+    assert lexaccess.get_matches('sex')[0].eui == 'E0055486'
+    lexaccess.close()
+    assert received_terms(log_path).count('sex') == 1
+
+    # records parsed with another configuration or lexicon version are looked up again
+    for options in [{'infl_vars' : True}, {'version' : 'lexAccess2020'}]:
+        lexaccess = LexAccess(path, cache_size = 0, cache_path = cache_path, **options)
+        assert lexaccess.get_matches('sex')[0].eui == 'E0055486'
+        lexaccess.close()
+    assert received_terms(log_path).count('sex') == 3
@@ -0,0 +1,69 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+
+import spacy
+from spacy.tokens import Doc
+
+import spacy_components
+from lexindex import LexIndex, build_index
+
+INFLECTION_TABLE = '''sex hormone|noun|base|E0055508|sex hormone|sex hormone
+sex hormones|noun|plural|E0055508|sex hormone|sex hormone
+sex|noun|base|E0055486|sex|sex
+sex|verb|base|E0055487|sex|sex
+patients|noun|plural|E0046024|patient|patient
+'''
+
+def create_index(tmp_path):
+    table_path = tmp_path / 'inflVars.data'
+    table_path.write_text(INFLECTION_TABLE)
+
+    index_path = tmp_path / 'lexicon.pkl'
+    LexIndex.save(build_index(str(table_path)), str(index_path))
+    return LexIndex(str(index_path))
+
+def test_get_matches(tmp_path):
+    lexindex = create_index(tmp_path)
+
+    lexrecords = lexindex.get_matches('Sex')
+    assert [(lexrecord.eui, lexrecord.cat) for lexrecord in lexrecords] == [('E0055486', 'noun'), ('E0055487', 'verb')]
+    assert lexindex.get_matches('sex-hormones')[0].base == 'sex hormone'
+    assert lexindex.get_matches('hormone') is None
+
+def test_longest_matches(tmp_path):
+    lexindex = create_index(tmp_path)
+
+    words = ['Sex', 'hormones', 'in', 'patients', None, 'sex']
+    matches = [(start, end, lexrecords[0].eui) for start, end, lexrecords in lexindex.longest_matches(words)]
+    assert matches == [(0, 2, 'E0055508'), (3, 4, 'E0046024'), (5, 6, 'E0055486')]
+
+def test_get_matches_batch(tmp_path):
+    lexindex = create_index(tmp_path)
+
+    matches = lexindex.get_matches_batch(['sex hormones', 'hormone'])
+    assert matches['sex hormones'][0].eui == 'E0055508'
+    assert matches['hormone'] is None
+
+def test_lexmatcher_component(tmp_path):
+    create_index(tmp_path)
+
+    words = ['Sex', 'hormones', 'in', 'patients', ',', 'sex']
+    tags = ['NN', 'NNS', 'IN', 'NNS', ',', 'VB']
+    # registered again by the factory
+    if Doc.has_extension('lexmatches'):
+        Doc.remove_extension('lexmatches')
+
+    nlp = spacy.blank('en')
+    lexmatchers = [nlp.add_pipe('lexmatcher', config = {'mode' : 'index', 'index_path' : str(tmp_path / 'lexicon.pkl')}),
+                   # the Doc extension is already registered by the factory above
+                   spacy_components.LexMatcherComponent(nlp, None, 'index', index_path = str(tmp_path / 'lexicon.pkl'),
+                                                        max_ngram = 2)]
+    for lexmatcher in lexmatchers:
+        doc = Doc(nlp.vocab, words = words, tags = tags, sent_starts = [True] + [False] * (len(words) - 1))
+        doc._.lexmatches = []
+        doc = lexmatcher(doc)
+
+        matches = [(lexmatch.span.text, [lexrecord.cat for lexrecord in lexmatch.lexrecord]) for lexmatch in doc._.lexmatches]
+        # single tokens keep the records of their part of speech
+        assert matches == [('Sex hormones', ['noun']), ('patients', ['noun']), ('sex', ['verb'])]
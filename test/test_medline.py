@@ -0,0 +1,101 @@
+import sys
+sys.path.append('..')
+
+import gzip
+import shutil
+
+from medline import read_plaintext_file, parse_medline_file, parse_medlinexml_file
+
+MEDLINE_FILE = 'test_files/medline/15996060.ml'
+PLAINTEXT_FILE = 'test_files/plaintext/test.txt'
+MEDLINEXML_FILE = 'test_files/medlinexml/test.xml'
+
+def gzip_file(path, gz_path):
+    with open(path, 'rb') as f, gzip.open(gz_path, 'wb') as gz:
+        shutil.copyfileobj(f, gz)
+
+def test_parse_medline_file(tmp_path):
+    docs = list(parse_medline_file(MEDLINE_FILE))
+    assert len(docs) == 2
+    assert docs[0].PMID == '15996060'
+    assert docs[0].title == 'Sex hormone concentrations in patients with rheumatoid arthritis are not ' \
+                            'normalized during 12 weeks of anti-tumor necrosis factor therapy.'
+    assert docs[0].abstract.startswith('OBJECTIVE: Androgens such as dehydroepiandrosterone sulfate (DHEAS) and testosterone')
+
+    gz_path = str(tmp_path / 'citations.ml.gz')
+    gzip_file(MEDLINE_FILE, gz_path)
+    assert [(doc.PMID, doc.title, doc.abstract) for doc in parse_medline_file(gz_path)] == \
+           [(doc.PMID, doc.title, doc.abstract) for doc in docs]
+
+def test_last_citation(tmp_path):
+    # the last citation is kept without an empty line at the end of the file
+    with open(MEDLINE_FILE, 'r') as f:
+        citations = f.read().strip()
+    path = str(tmp_path / 'citations.ml')
+    with open(path, 'w') as f:
+        f.write(citations)
+    assert [doc.PMID for doc in parse_medline_file(path)] == [doc.PMID for doc in parse_medline_file(MEDLINE_FILE)]
+
+def test_streaming(tmp_path):
+    with open(MEDLINE_FILE, 'r') as f:
+        citation = f.read().strip() + '\n\n'
+    path = str(tmp_path / 'citations.ml')
+    with open(path, 'w') as f:
+        for _ in range(500):
+            f.write(citation)
+        # a continuation line outside of any citation fails when it is reached
+        f.write('      continuation\n')
+
+    # citations are yielded before the rest of the file is read
+    docs = parse_medline_file(path)
+    assert [next(docs).PMID for _ in range(1000)] == ['15996060', '167592'] * 500
+    try:
+        next(docs)
+        assert False
+    except ValueError as e:
+        assert f'line {len(citation.splitlines()) * 500 + 1}' in str(e)
+
+    # at the start of the file too
+    path = str(tmp_path / 'continuation.ml')
+    with open(path, 'w') as f:
+        f.write('      continuation\n\n' + citation)
+    try:
+        next(parse_medline_file(path))
+        assert False
+    except ValueError as e:
+        assert 'line 1:' in str(e)
+
+def test_read_plaintext_file(tmp_path):
+    docs = list(read_plaintext_file(PLAINTEXT_FILE))
+    assert len(docs) == 1
+    assert docs[0].PMID is None and docs[0].abstract.startswith('Aberrant auditory processing')
+
+    gz_path = str(tmp_path / 'test.txt.gz')
+    gzip_file(PLAINTEXT_FILE, gz_path)
+    assert [doc.abstract for doc in read_plaintext_file(gz_path)] == [doc.abstract for doc in docs]
+
+def test_parse_medlinexml_file(tmp_path):
+    docs = list(parse_medlinexml_file(MEDLINEXML_FILE))
+    assert [doc.PMID for doc in docs] == ['33287446', '33287447']
+    assert docs[0].title.startswith('Insight into Cisplatin-Resistance Signaling')
+    assert docs[0].abstract.startswith('The microenvironment possesses a strong impact')
+
+    gz_path = str(tmp_path / 'test.xml.gz')
+    gzip_file(MEDLINEXML_FILE, gz_path)
+    assert [(doc.PMID, doc.title, doc.abstract) for doc in parse_medlinexml_file(gz_path)] == \
+           [(doc.PMID, doc.title, doc.abstract) for doc in docs]
+
+def test_skip_no_abstract(tmp_path):
+    with open(MEDLINEXML_FILE, 'r', encoding = 'utf-8') as f:
+        xml = f.read()
+    # drop the abstract of the first citation
+    start = xml.index('<Abstract>')
+    end = xml.index('</Abstract>') + len('</Abstract>')
+    path = str(tmp_path / 'test.xml')
+    with open(path, 'w', encoding = 'utf-8') as f:
+        f.write(xml[:start] + xml[end:])
+
+    docs = list(parse_medlinexml_file(path))
+    assert [doc.PMID for doc in docs] == ['33287446', '33287447']
+    assert docs[0].abstract == ''
+    assert [doc.PMID for doc in parse_medlinexml_file(path, skip_no_abstract = True)] == ['33287447']
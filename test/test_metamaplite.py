@@ -0,0 +1,77 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+import pickle
+
+from cache import CachedAnnotator, LookupCache
+from concepts import SEMGROUPS, SEMTYPES
+from metamaplite import MetamapLite, BATCH_DELIMITER
+
+class JoinedMetamapLite(MetamapLite):
+    '''
+        Answers with the span of every 'aspirin' and of one span across the first delimiter
+    '''
+    def annotate(self, text):
+        self.requests.append(text)
+        annotations = {}
+        start = text.find('aspirin')
+        while start != -1:
+            annotations[(start, 7)] = [{'cui' : 'C0004057'}]
+            start = text.find('aspirin', start + 1)
+        boundary = text.find(BATCH_DELIMITER)
+        if boundary != -1:
+            annotations[(boundary - 2, 5 + len(BATCH_DELIMITER))] = [{'cui' : 'C0000000'}]
+        return annotations
+
+def test_annotate_batch():
+    metamaplite = JoinedMetamapLite('localhost', 12345, batch_bytes = 1000)
+    metamaplite.requests = []
+
+    annotations = metamaplite.annotate_batch(['aspirin for pain', 'no concept', 'take\naspirin'])
+
+    assert len(metamaplite.requests) == 1
+    assert '\n' not in metamaplite.requests[0]
+    assert annotations == [{(0, 7) : [{'cui' : 'C0004057'}]}, {}, {(5, 7) : [{'cui' : 'C0004057'}]}]
+
+def test_annotate_batch_budget():
+    metamaplite = JoinedMetamapLite('localhost', 12345, batch_bytes = 30)
+    metamaplite.requests = []
+
+    annotations = metamaplite.annotate_batch(['aspirin for pain', 'no concept', 'aspirin'])
+
+    assert len(metamaplite.requests) == 2
+    assert annotations[2] == {(0, 7) : [{'cui' : 'C0004057'}]}
+
+def test_annotate_batch_opt_in():
+    metamaplite = JoinedMetamapLite('localhost', 12345)
+    metamaplite.requests = []
+
+    # one request per document by default
+    annotations = metamaplite.annotate_batch(['aspirin for pain', 'no concept'])
+    assert metamaplite.requests == ['aspirin for pain', 'no concept']
+    assert annotations == [{(0, 7) : [{'cui' : 'C0004057'}]}, {}]
+
+    # batched annotations are cached apart from the annotations of single documents
+    cache = LookupCache()
+    single = CachedAnnotator(metamaplite, 'MetamapLite', cache = cache)
+    batched = CachedAnnotator(JoinedMetamapLite('localhost', 12345, batch_bytes = 1000), 'MetamapLite', cache = cache)
+    assert single.key('aspirin') != batched.key('aspirin')
+
+def test_parse_annotations():
+    response = '0,,9,,C0002771,,Analgesics,,analgesic,,1000.0,,hops::orch::phsu,,tmod::tmod::tmod,,;;' \
+               '10,,7,,C0004057,,Aspirin,,aspirin,,833.3333333333334,,orch::phsu,,tmod::tmod,,' \
+               'C0000001,,Aspirin preparation,,aspirin,,500.0,,phsu,,chem,,;;'
+    annotations = MetamapLite('localhost', 12345).parse_annotations(response)
+
+    assert list(annotations) == [(0, 9), (10, 7)]
+    assert len(annotations[(10, 7)]) == 2
+
+    aspirin = annotations[(10, 7)][0]
+    assert aspirin['cui'] == 'C0004057' and aspirin['concept_string'] == 'aspirin'
+    assert aspirin['semtypes'] == ('orch', 'phsu')
+    assert SEMTYPES.decode(aspirin.semtype_mask) == ['orch', 'phsu']
+    # concepts with the same types share them
+    assert annotations[(0, 9)][0].semgroups is SEMGROUPS.parse('tmod::tmod::tmod')[0]
+    assert aspirin.semgroup_mask & annotations[(0, 9)][0].semgroup_mask
+
+    assert pickle.loads(pickle.dumps(annotations)) == annotations
@@ -0,0 +1,82 @@
+import sys
+sys.path.append('..')
+
+import os
+import stat
+
+from opennlpcl import OpenNLP, OpenNLPPool
+
+# stands in for bin/opennlp ChunkerME: every token tagged NN or JJ becomes a noun phrase,
+# a token starting with BAD makes the line invalid (answered with two lines), and the
+# process id is logged with every line
+FAKE_OPENNLP = '''#!{python}
+import os
+import random
+import sys
+import time
+
+print('Loading Chunker model ... done (0.1s)', flush = True)
+for line in sys.stdin:
+    with open({log!r}, 'a') as log:
+        log.write(str(os.getpid()) + '\\n')
+    tokens = line.split()
+    if any(token.startswith('BAD') for token in tokens):
+        print('Invalid format:', flush = True)
+        print(line.strip(), flush = True)
+        continue
+    time.sleep(random.random() * 0.005)
+    print(' '.join(f'[NP {{token}} ]' if token.endswith('_NN') or token.endswith('_JJ') else token
+                   for token in tokens), flush = True)
+'''
+
+def write_fake_opennlp(tmp_path):
+    '''
+        :returns
+            (path of the OpenNLP folder, path of the log)
+    '''
+    os.makedirs(tmp_path / 'bin')
+    path = str(tmp_path / 'bin' / 'opennlp')
+    log_path = str(tmp_path / 'opennlp.log')
+    with open(path, 'w') as f:
+        f.write(FAKE_OPENNLP.format(python = sys.executable, log = log_path))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return str(tmp_path), log_path
+
+def chunked(text):
+    return ' '.join(f'[NP {token} ]' if token.endswith('_NN') else token for token in text.split())
+
+def test_parse(tmp_path):
+    path, log_path = write_fake_opennlp(tmp_path)
+    opennlp = OpenNLP(path)
+
+    assert opennlp.parse('Sex_NN hormones_NN are_VBP low_JJ').strip() == '[NP Sex_NN ] [NP hormones_NN ] are_VBP [NP low_JJ ]'
+    # an invalid line and both lines of its answer are consumed
+    assert opennlp.parse('BAD_line') is False
+    assert opennlp.parse('in_IN patients_NN').strip() == 'in_IN [NP patients_NN ]'
+
+def test_parse_many(tmp_path, capsys):
+    path, log_path = write_fake_opennlp(tmp_path)
+    opennlp = OpenNLP(path)
+
+    # more lines than the window, with invalid lines in flight
+    texts = [f'word{i}_NN in_IN' if i % 7 else f'BAD{i}_NN' for i in range(50)]
+    for window in [1, 16]:
+        results = opennlp.parse_many(texts, window)
+        assert [result.strip() if result is not False else False for result in results] == \
+               [chunked(text) if i % 7 else False for i, text in enumerate(texts)]
+    # answered by the pipeline, not by the one at a time fallback
+    assert 'not responding' not in capsys.readouterr().out
+
+def test_pool_order(tmp_path):
+    path, log_path = write_fake_opennlp(tmp_path)
+    pool = OpenNLPPool(path, workers = 3, batch_size = 4)
+
+    texts = [f'word{i}_NN' if i % 11 else f'BAD{i}' for i in range(60)]
+    results = pool.parse_many(texts)
+    assert [result.strip() if result is not False else False for result in results] == \
+           [chunked(text) if i % 11 else False for i, text in enumerate(texts)]
+    assert pool.parse('word_NN').strip() == '[NP word_NN ]'
+
+    # the batches were spread over the processes
+    with open(log_path, 'r') as f:
+        assert len(set(f.read().split())) == 3
@@ -0,0 +1,71 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+
+import itertools
+import spacy
+
+import spacy_components
+from predicateindex import PredicateIndex
+
+ONTOLOGY_DB = 'resources/12859_2020_3517_MOESM2_ESM.txt'
+
+def test_predicate_index(tmp_path):
+    index = PredicateIndex.load(ONTOLOGY_DB, str(tmp_path / 'ontology.pickle'))
+    assert len(index) == 7398
+    assert index.allows('aapp', 'affects', 'biof')
+    assert not index.allows('biof', 'affects', 'aapp')
+    assert 'affects' in index.get_predicates('aapp', 'biof')
+
+    # the cached index is read back
+    assert PredicateIndex.load(ONTOLOGY_DB, str(tmp_path / 'ontology.pickle')).objects == index.objects
+
+def scan_verify_and_generate(ontology_db, candidate_pairs):
+    '''
+        verify_and_generate of noun compounds with the linear scan of the ontology lines
+    '''
+    for modhead in spacy_components.MODHEAD_TYPES:
+        inverse = False
+        if modhead.startswith('inverse:'):
+            inverse = True
+            modhead = modhead.replace('inverse:', '')
+        for candidate_pair in candidate_pairs:
+            if inverse and '-'.join([candidate_pair[1], modhead, candidate_pair[0]]) in ontology_db:
+                return modhead, inverse
+            elif '-'.join([candidate_pair[0], modhead, candidate_pair[1]]) in ontology_db:
+                return modhead, inverse
+    return None, None
+
+def test_verify_and_generate():
+    component = spacy_components.RelationalAnalysisComponent(spacy.blank('en'), ONTOLOGY_DB)
+    with open(ONTOLOGY_DB, 'r') as f:
+        ontology_db = [line.strip().split('|')[1] for line in f]
+
+    semtypes = ['aapp', 'biof', 'dsyn', 'phsu', 'bpoc', 'topp', 'podg', 'orch', 'neop', 'celc']
+    pairs = [list(pair) for pair in itertools.product(semtypes, repeat = 2)]
+    for i in range(len(pairs)):
+        candidate_pairs = pairs[i:i + 3]
+        assert component.verify_and_generate(None, None, candidate_pairs, 'MODHEAD') == \
+               scan_verify_and_generate(ontology_db, candidate_pairs)
+
+def test_allowed_pairs():
+    index = PredicateIndex.load(ONTOLOGY_DB)
+    assert index.allowed.sum() == len(index)
+
+    subjects = index.encode_semtypes(['aapp', 'biof', 'xxxx'])
+    objects = index.encode_semtypes(['biof', 'aapp', 'aapp'])
+    predicates = index.encode_predicates(['affects', 'unknown_predicate'])
+    allowed = index.allowed_pairs(subjects, predicates, objects)
+    assert allowed.shape == (3, 2)
+    assert allowed.tolist() == [[True, False], [False, False], [False, False]]
+
+def test_verify_modheads():
+    component = spacy_components.RelationalAnalysisComponent(spacy.blank('en'), ONTOLOGY_DB)
+    with open(ONTOLOGY_DB, 'r') as f:
+        ontology_db = [line.strip().split('|')[1] for line in f]
+
+    semtypes = ['aapp', 'biof', 'dsyn', 'phsu', 'bpoc', 'topp', 'podg', 'orch', 'neop', 'celc', 'xxxx']
+    pairs = [list(pair) for pair in itertools.product(semtypes, repeat = 2)]
+    candidate_pair_lists = [pairs[i:i + 3] for i in range(len(pairs))] + [[]]
+    assert component.verify_modheads(candidate_pair_lists) == \
+           [scan_verify_and_generate(ontology_db, candidate_pairs) for candidate_pairs in candidate_pair_lists]
@@ -0,0 +1,50 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+
+from replayserver import Fixtures, ReplayServer
+from socketclient import SocketClient
+from metamaplite import MetamapLite
+from gnormplus import GNormPlus
+
+METAMAPLITE_RESPONSE = '0,,9,,C0002771,,Analgesics,,analgesic,,1000.0,,hops::orch::phsu,,tmod::tmod::tmod,,;;' \
+                       '10,,7,,C0004057,,Aspirin,,aspirin,,833.3333333333334,,orch::phsu,,tmod::tmod,,;;'
+
+def test_replay(tmp_path):
+    fixtures = Fixtures(str(tmp_path / 'fixtures.jsonl'))
+    fixtures.record('metamaplite', 'analgesic aspirin', METAMAPLITE_RESPONSE)
+    fixtures.record('gnormplus', 'BRCA1 mutations', '0\t5\tBRCA1\tGene\t672')
+
+    fixtures = Fixtures(str(tmp_path / 'fixtures.jsonl'))
+    metamaplite_server = ReplayServer('metamaplite', fixtures).start()
+    gnormplus_server = ReplayServer('gnormplus', fixtures).start()
+
+    # (MetamapLite.annotate also appends the response to an.tmp)
+    metamaplite = MetamapLite('localhost', metamaplite_server.port)
+    response = SocketClient('localhost', metamaplite_server.port).send('analgesic aspirin')
+    assert metamaplite.parse_annotations(response)[(10, 7)][0]['cui'] == 'C0004057'
+    assert (0, 5) in GNormPlus('localhost', gnormplus_server.port).annotate('BRCA1 mutations')
+
+    # requests without a recorded response get an empty response
+    assert SocketClient('localhost', metamaplite_server.port).send('unseen text') == ''
+    assert fixtures.misses == 1
+
+    metamaplite_server.shutdown()
+    gnormplus_server.shutdown()
+
+def test_record_and_framing():
+    upstream_fixtures = Fixtures()
+    upstream_fixtures.record('hierarchy', 'C0004057C0002771', 'true')
+    upstream = ReplayServer('hierarchy', upstream_fixtures).start()
+
+    fixtures = Fixtures()
+    recorder = ReplayServer('hierarchy', fixtures, upstream = ('localhost', upstream.port),
+                            framing = 'length').start()
+
+    client = SocketClient('localhost', recorder.port, framing = 'length')
+    assert client.send('C0004057C0002771') == 'true'
+    assert client.send('C0004057C0002771') == 'true'
+    assert fixtures.get('hierarchy', 'C0004057C0002771') == 'true'
+
+    recorder.shutdown()
+    upstream.shutdown()
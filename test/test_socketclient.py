@@ -0,0 +1,113 @@
+import sys
+sys.path.append('..')
+sys.path.append('server')
+
+import socketserver
+import struct
+import threading
+import time
+
+from socketclient import SocketClient, connection_pool
+
+class LengthFramedHandler(socketserver.BaseRequestHandler):
+    connections = 0
+
+    def receive_exactly(self, length):
+        data = b''
+        while len(data) < length:
+            data += self.request.recv(length - len(data))
+        return data
+
+    def handle(self):
+        LengthFramedHandler.connections += 1
+        while True:
+            header = self.request.recv(4)
+            if not header:
+                break
+            text = self.receive_exactly(struct.unpack('>I', header)[0]).decode('UTF-8')
+            response = (text.strip() * 3000).encode('UTF-8')
+            self.request.sendall(struct.pack('>I', len(response)) + response)
+
+def test_length_framing_reuses_connection():
+    server = socketserver.ThreadingTCPServer(('localhost', 0), LengthFramedHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    try:
+        socket_client = SocketClient('localhost', server.server_address[1], framing = 'length')
+        # responses larger than the receive buffer are read completely
+        assert socket_client.send('ab') == 'ab' * 3000
+        assert socket_client.send('cd') == 'cd' * 3000
+        assert LengthFramedHandler.connections == 1
+    finally:
+        connection_pool.close_all()
+        server.shutdown()
+        server.server_close()
+
+class SplitReplyHandler(socketserver.StreamRequestHandler):
+    # the reply is written in two parts, then the connection is closed
+    def handle(self):
+        self.rfile.readline()
+        self.wfile.write(b'a' * 1000)
+        self.wfile.flush()
+        time.sleep(0.2)
+        self.wfile.write(b'b' * 9000)
+
+class SplitTerminatedHandler(socketserver.StreamRequestHandler):
+    # keep-alive multi-line replies ending with a blank line, written in several parts
+    # that end with a line break
+    def handle(self):
+        while self.rfile.readline():
+            for part in [b'x' * 3000 + b'\n', b'y' * 3000 + b'\n', b'z' * 4000 + b'\n\n']:
+                self.wfile.write(part)
+                self.wfile.flush()
+                time.sleep(0.05)
+
+class KeepOpenHandler(socketserver.StreamRequestHandler):
+    # legacy replies written in two parts, the connection stays open for the next request
+    def handle(self):
+        while self.rfile.readline():
+            self.wfile.write(b'a' * 1000 + b'\n')
+            self.wfile.flush()
+            time.sleep(0.1)
+            self.wfile.write(b'b' * 9000 + b'\n')
+            self.wfile.flush()
+
+def serve(handler):
+    server = socketserver.ThreadingTCPServer(('localhost', 0), handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+def test_reply_in_several_writes():
+    server = serve(SplitReplyHandler)
+    try:
+        socket_client = SocketClient('localhost', server.server_address[1])
+        # a short read does not end the response, the end of stream does
+        assert socket_client.send('query', True) == 'a' * 1000 + 'b' * 9000
+        assert socket_client.send('query') == 'a' * 1000 + 'b' * 9000
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_terminator_framing_reply_in_several_writes():
+    server = serve(SplitTerminatedHandler)
+    try:
+        socket_client = SocketClient('localhost', server.server_address[1], framing = 'terminator')
+        expected = 'x' * 3000 + '\n' + 'y' * 3000 + '\n' + 'z' * 4000
+        assert socket_client.send('query') == expected
+        assert socket_client.send('query') == expected
+    finally:
+        connection_pool.close_all()
+        server.shutdown()
+        server.server_close()
+
+def test_receive_once_connection_kept_open():
+    server = serve(KeepOpenHandler)
+    try:
+        socket_client = SocketClient('localhost', server.server_address[1], idle_timeout = 0.5)
+        # the response ends when the server is quiet, not when the connection is closed
+        start = time.time()
+        assert socket_client.send('query', True) == 'a' * 1000 + '\n' + 'b' * 9000
+        assert time.time() - start < 2
+    finally:
+        server.shutdown()
+        server.server_close()
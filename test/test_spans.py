@@ -0,0 +1,59 @@
+import sys
+sys.path.append('..')
+
+import random
+
+from spans import fuse_spans, FenwickTree, TokenOffsetIndex
+
+def quadratic_fuse_spans(spans):
+    # previous implementation of ConceptMatchComponent, kept as reference
+    span_lengths = {}
+    for start, end in spans:
+        span_lengths.setdefault(end - start, []).append((start, end))
+
+    merged = []
+    for span_length in sorted(span_lengths, reverse = True):
+        for start, end in span_lengths[span_length]:
+            cur_span_range = set(range(start, end))
+            if all(len(cur_span_range.intersection(set(range(merged_start, merged_end)))) == 0
+                   for merged_start, merged_end in merged):
+                merged.append((start, end))
+    return merged
+
+def test_longest_span_first():
+    spans = [(10, 17), (0, 9), (0, 17), (20, 25), (24, 30), (17, 17)]
+    assert fuse_spans(spans) == [(0, 17), (24, 30), (17, 17)]
+
+def test_same_result_as_quadratic_fusion():
+    rng = random.Random(0)
+    for _ in range(200):
+        spans = set()
+        for _ in range(rng.randint(0, 40)):
+            start = rng.randint(0, 200)
+            spans.add((start, start + rng.randint(0, 15)))
+        spans = list(spans)
+        rng.shuffle(spans)
+
+        assert fuse_spans(spans) == quadratic_fuse_spans(spans)
+
+def test_fenwick_tree():
+    tree = FenwickTree(10)
+    for position in [7, 2, 5]:
+        tree.add(position)
+
+    assert [tree.prefix_count(end) for end in [0, 2, 3, 6, 8, 10]] == [0, 0, 1, 2, 3, 3]
+    assert [tree.find(k) for k in [1, 2, 3]] == [2, 5, 7]
+
+def test_token_span():
+    # Analgesic aspirin (ASA).
+    offset_index = TokenOffsetIndex([(0, 9), (10, 17), (18, 19), (19, 22), (22, 23), (23, 24)])
+
+    assert offset_index.token_span(0, 9) == (0, 1)
+    assert offset_index.token_span(0, 17) == (0, 2)
+    assert offset_index.token_span(19, 22) == (3, 4)
+    # offsets inside a token cover the whole token
+    assert offset_index.token_span(2, 12) == (0, 2)
+    # offsets in whitespace move to the closest token inside the span
+    assert offset_index.token_span(9, 18) == (1, 2)
+    assert offset_index.token_span(9, 10) is None
+    assert offset_index.token_span(30, 35) is None
@@ -0,0 +1,15 @@
+import sys
+sys.path.append('..')
+
+from tagchunker import chunk_tags
+
+def test_chunk_tags():
+    # Sex hormone concentrations in patients with rheumatoid arthritis are not normalized .
+    tags = ['NN', 'NN', 'NNS', 'IN', 'NNS', 'IN', 'JJ', 'NN', 'VBP', 'RB', 'VBN', '.']
+    assert chunk_tags(tags) == [(0, 3, 'NP'), (3, 4, 'PP'), (4, 5, 'NP'), (5, 6, 'PP'),
+                                (6, 8, 'NP'), (8, 11, 'VP'), (11, 12, '.')]
+
+def test_parenthesized_abbreviation():
+    # rheumatoid arthritis ( RA ) than controls
+    tags = ['JJ', 'NN', '-LRB-', 'NN', '-RRB-', 'IN', 'NNS']
+    assert chunk_tags(tags) == [(0, 5, 'NP'), (5, 6, 'PP'), (6, 7, 'NP')]
@@ -0,0 +1,64 @@
+'''
+Token tries shared by LexIndex and DictionaryConceptMatcher.
+
+A trie is a dict that maps a lower-cased token to its child node; the node reached
+by the last token of a string holds the values of that string under VALUES_KEY.
+Tries are plain dicts, so they are pickled as they are.
+'''
+import sys
+
+# key under which a trie node keeps the values of the token sequence ending at that node
+# (tokens are never empty, so it cannot clash with a child)
+VALUES_KEY = ''
+
+def trie_add(trie, tokens, value):
+    '''
+        Adds value to the values of tokens, once
+    '''
+    node = trie
+    for token in tokens:
+        node = node.setdefault(sys.intern(token), {})
+
+    values = node.setdefault(VALUES_KEY, [])
+    if value not in values:
+        values.append(value)
+
+def trie_find(trie, tokens):
+    '''
+        :returns
+            values of tokens, None if tokens are not in the trie
+    '''
+    node = trie
+    for token in tokens:
+        node = node.get(token)
+        if node is None:
+            return None
+    return node.get(VALUES_KEY)
+
+def longest_match(trie, units, start):
+    '''
+        Longest walk down the trie from units[start]
+
+        :params
+            units: token lists (e.g. the tokens of each word of a sentence); a unit
+                   is matched by all its tokens, an empty unit or None stops the walk
+        :returns
+            (end, values) of the longest match, end exclusive, or (None, None)
+    '''
+    end = None
+    values = None
+
+    node = trie
+    cur = start
+    while cur < len(units) and units[cur]:
+        for token in units[cur]:
+            node = node.get(token)
+            if node is None:
+                return end, values
+
+        cur += 1
+        if VALUES_KEY in node:
+            end = cur
+            values = node[VALUES_KEY]
+
+    return end, values
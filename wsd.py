@@ -2,9 +2,10 @@ from socketclient import SocketClient
 import json
 
 class WSD:
-    def __init__(self, host, port):
+    def __init__(self, host, port, **client_options):
         self.host = host
         self.port = port
+        self.client_options = client_options
 
     def disambiguate(self, annotations, text):
         all_queries = ''
@@ -21,7 +22,7 @@ class WSD:
 
             all_queries += json.dumps(query) + '\t\t\t'
 
-        socket_client = SocketClient(self.host, self.port)
+        socket_client = SocketClient(self.host, self.port, **self.client_options)
         responses = socket_client.send(all_queries)
 
         for response in responses.split('\t\t\t'):